@@ -0,0 +1,144 @@
+"""
+离线基准测试用的 astrbot.api 桩模块
+在导入 main.py 之前调用 install()，即可脱离 AstrBot 运行环境实例化插件
+"""
+import asyncio
+import logging
+import random
+import sys
+import types
+
+
+class _Filter:
+    """模拟 astrbot.api.event.filter：所有装饰器原样返回被装饰函数"""
+
+    class PermissionType:
+        ADMIN = "admin"
+        MEMBER = "member"
+
+    class EventMessageType:
+        ALL = "all"
+        GROUP_MESSAGE = "group"
+        PRIVATE_MESSAGE = "private"
+
+    @staticmethod
+    def _passthrough(*args, **kwargs):
+        return lambda func: func
+
+    command = _passthrough
+    permission_type = _passthrough
+    event_message_type = _passthrough
+
+
+class MessageChain:
+    def __init__(self, chain=None):
+        self.chain = list(chain) if chain else []
+
+
+class At:
+    def __init__(self, qq):
+        self.qq = qq
+
+
+class Plain:
+    def __init__(self, text):
+        self.text = text
+
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+
+def register(*args, **kwargs):
+    return lambda cls: cls
+
+
+class SimulatedSendError(Exception):
+    """模拟平台接口错误（带retcode，与aiocqhttp等适配器抛出的异常一致）"""
+
+    def __init__(self, retcode, message="simulated send failure"):
+        super().__init__(message)
+        self.retcode = retcode
+
+
+class SimulatedContext:
+    """
+    模拟 Context.send_message：可配置固定延迟、随机抖动（秒）与错误注入
+    error_rate为每次发送失败的概率，失败时从error_retcodes中随机取retcode；seed固定随机序列便于对比
+    """
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_retcodes=(1200,), seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_retcodes = tuple(error_retcodes)
+        self.random = random.Random(seed)
+        self.sent = 0
+        self.failed = 0
+
+    async def send_message(self, umo, message_chain):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.failed += 1
+            raise SimulatedSendError(self.random.choice(self.error_retcodes))
+        self.sent += 1
+        return True
+
+
+class SimulatedEvent:
+    """模拟 AstrMessageEvent：指令处理器只用到群ID、umo与plain_result"""
+
+    class _MessageObj:
+        def __init__(self, group_id):
+            self.group_id = group_id
+
+    def __init__(self, group_id: str = "", platform: str = "aiocqhttp"):
+        self.message_obj = self._MessageObj(group_id)
+        self.unified_msg_origin = f"{platform}:GroupMessage:{group_id}" if group_id else f"{platform}:FriendMessage:admin"
+
+    def get_group_id(self):
+        return self.message_obj.group_id
+
+    def plain_result(self, text):
+        return text
+
+
+def install():
+    """将桩模块注册到 sys.modules（重复调用安全）"""
+    if "astrbot.api" in sys.modules:
+        return
+    logger = logging.getLogger("astrbot_stub")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    astrbot = types.ModuleType("astrbot")
+    api = types.ModuleType("astrbot.api")
+    api.logger = logger
+    api.AstrBotConfig = dict
+    event = types.ModuleType("astrbot.api.event")
+    event.filter = _Filter
+    event.AstrMessageEvent = object
+    event.MessageChain = MessageChain
+    star = types.ModuleType("astrbot.api.star")
+    star.Context = SimulatedContext
+    star.Star = Star
+    star.register = register
+    components = types.ModuleType("astrbot.api.message_components")
+    components.At = At
+    components.Plain = Plain
+
+    astrbot.api = api
+    api.event = event
+    api.star = star
+    api.message_components = components
+    sys.modules.update({
+        "astrbot": astrbot,
+        "astrbot.api": api,
+        "astrbot.api.event": event,
+        "astrbot.api.star": star,
+        "astrbot.api.message_components": components,
+    })
@@ -0,0 +1,46 @@
+"""
+并发扇出基准：对比不同群数量、不同并发上限下一次公告推送的总耗时
+用法：python benchmarks/bench_fanout.py [--latency 0.02] [--jitter 0.0]
+"""
+import argparse
+import asyncio
+import time
+
+import harness
+from harness import astrbot_stub, main
+
+GROUP_COUNTS = [10, 100, 500, 1000]
+CONCURRENCY_LEVELS = [1, 10, 50]
+
+
+async def run_once(count: int, concurrency: int, latency: float, jitter: float) -> float:
+    context = astrbot_stub.SimulatedContext(latency=latency, jitter=jitter)
+    with harness.workdir():  # 每轮使用独立数据目录，避免续推上一轮的推送任务
+        plugin = await harness.create_plugin(context, push_concurrency=concurrency)  # 已关闭限流，只衡量并发扇出本身
+        plugin.groups = main.GroupRegistry(harness.build_groups(count))
+        start = time.perf_counter()
+        await plugin._send_announcement_to_groups("基准测试公告")
+        elapsed = time.perf_counter() - start
+        await plugin.terminate()
+    assert context.sent == count, (context.sent, count)
+    return elapsed
+
+
+async def main_async(args):
+    print(f"模拟单次发送延迟={args.latency}s 抖动={args.jitter}s")
+    print(f"{'群数量':>8} | " + " | ".join(f"并发={c:<4}" for c in CONCURRENCY_LEVELS))
+    for count in GROUP_COUNTS:
+        cells = []
+        for concurrency in CONCURRENCY_LEVELS:
+            if concurrency == 1 and count * args.latency > 30:
+                cells.append(f"{'跳过':>7}")
+                continue
+            cells.append(f"{await run_once(count, concurrency, args.latency, args.jitter):7.3f}s")
+        print(f"{count:>8} | " + " | ".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,65 @@
+"""
+群配置存储后端基准：对比整文件重写（json）与追加写日志（journal）的单次变更落盘耗时
+每次变更后立即flush（防抖间隔为0），衡量的是单次变更的最坏I/O成本
+用法：python benchmarks/bench_storage.py [--mutations 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from harness import build_groups, main
+
+GROUP_COUNTS = [100, 1000, 5000, 10000]
+
+
+def build_registry(count: int) -> "main.GroupRegistry":
+    return main.GroupRegistry(build_groups(count))
+
+
+async def measure(store, registry, mutations: int) -> list:
+    latencies = []
+    group_ids = [record.group_id for record in registry]
+    for i in range(mutations):
+        group_id = group_ids[i % len(group_ids)]
+        now = datetime.now().strftime(main.TIME_FORMAT)
+        registry.refresh_umo(group_id, f"aiocqhttp:GroupMessage:{group_id}", now)
+        start = time.perf_counter()
+        store.mark_dirty({"op": "refresh", "group_id": group_id,
+                          "fields": {"umo": f"aiocqhttp:GroupMessage:{group_id}", "umo_update_time": now}})
+        await store.flush()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def main_async(args, workdir: str):
+    print(f"每种配置执行{args.mutations}次umo刷新，单位：毫秒/次")
+    print(f"{'群数量':>8} | {'json p50':>9} | {'json p99':>9} | {'journal p50':>11} | {'journal p99':>11}")
+    for count in GROUP_COUNTS:
+        registry = build_registry(count)
+
+        def snapshot():
+            return {"enabled_groups": registry.to_list(), "last_manual_push_time": ""}
+
+        snapshot_path = os.path.join(workdir, f"group_config_{count}.json")
+        json_store = main.DebouncedJsonStore(snapshot_path, "群配置", snapshot, delay=0)
+        journal_store = main.JournalStore(
+            snapshot_path, os.path.join(workdir, f"group_journal_{count}.log"), "群配置", snapshot,
+            delay=0, compact_threshold=args.mutations + 1)  # 测试期间不触发压缩
+        row = []
+        for store in (json_store, journal_store):
+            latencies = sorted(await measure(store, registry, args.mutations))
+            row.append(statistics.median(latencies) * 1000)
+            row.append(latencies[int(len(latencies) * 0.99) - 1] * 1000)
+        print(f"{count:>8} | {row[0]:9.2f} | {row[1]:9.2f} | {row[2]:11.2f} | {row[3]:11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mutations", type=int, default=200)
+    cli_args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(main_async(cli_args, tmp))
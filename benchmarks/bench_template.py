@@ -0,0 +1,71 @@
+"""
+消息链构建微基准：对比逐群新建MessageChain（旧实现）与预编译公告模板的内存分配与耗时
+用法：python benchmarks/bench_template.py [--groups 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import astrbot_stub  # noqa: E402
+
+astrbot_stub.install()
+import main  # noqa: E402
+
+CONTENT = "本周六晚8点开展社区活动\\n请各位群友准时参加"
+
+
+def legacy_build(group_ids, push_time):
+    """旧实现：每个群新建MessageChain、Comp.At与格式化的Comp.Plain"""
+    chains = []
+    for _ in group_ids:
+        message_chain = main.MessageChain()
+        message_chain.chain.append(main.Comp.At(qq="all"))
+        message_chain.chain.append(main.Comp.Plain(f"\n【管理员公告】\n{CONTENT}\n\n推送时间：{push_time}"))
+        chains.append(message_chain)
+    return chains
+
+
+def template_build(group_ids, push_time, content=CONTENT):
+    template = main.AnnouncementTemplate(content, push_time)
+    return [template.chain_for(gid, index + 1, with_at=True) for index, gid in enumerate(group_ids)]
+
+
+def measure(func, *args):
+    func(*args)  # 预热：排除首次调用的模块导入、正则编译等一次性分配
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    del result
+    return blocks, size, elapsed
+
+
+def main_cli(groups: int):
+    push_time = datetime.now().strftime(main.TIME_FORMAT)
+    group_ids = [str(100000 + i) for i in range(groups)]
+    cases = [
+        ("旧实现（逐群新建）", legacy_build, (group_ids, push_time)),
+        ("模板（无逐群占位符）", template_build, (group_ids, push_time)),
+        ("模板（含{group_id}）", template_build, (group_ids, push_time, CONTENT + "\\n本群：{group_id}")),
+    ]
+    print(f"{groups}个群的消息链构建（tracemalloc开启时耗时偏高，仅作相对比较）")
+    print(f"{'方案':<22} | {'新增内存块':>10} | {'新增字节':>10} | {'耗时ms':>8}")
+    for name, func, args in cases:
+        blocks, size, elapsed = measure(func, *args)
+        print(f"{name:<22} | {blocks:>10} | {size:>10} | {elapsed * 1000:8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=1000)
+    main_cli(parser.parse_args().groups)
@@ -0,0 +1,94 @@
+"""
+基准测试公共工具：临时工作目录、合成群配置、插件实例化与耗时/内存测量
+所有基准脚本均通过astrbot_stub脱离AstrBot运行，插件数据写入临时目录
+"""
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import astrbot_stub  # noqa: E402
+
+astrbot_stub.install()
+import main  # noqa: E402
+
+# 基准默认关闭限流与自动重试，只衡量插件自身开销（写盘防抖保持默认值，与实际部署一致）
+BENCH_CONFIG = {
+    "global_rate_limit": 0,
+    "platform_rate_limit": 0,
+    "retry_max_attempts": 1,
+}
+
+
+def build_groups(count: int, expired_ratio: float = 0.0) -> list:
+    """生成count个群记录（group_config.json格式），前expired_ratio比例的群umo已过期"""
+    now = datetime.now()
+    fresh = now.strftime(main.TIME_FORMAT)
+    expired = (now - timedelta(days=30)).strftime(main.TIME_FORMAT)
+    expired_cnt = int(count * expired_ratio)
+    return [
+        {"group_id": str(100000 + i), "umo": f"aiocqhttp:GroupMessage:{100000 + i}",
+         "add_time": fresh, "umo_update_time": expired if i < expired_cnt else fresh}
+        for i in range(count)
+    ]
+
+
+def write_group_config(count: int, expired_ratio: float = 0.0):
+    """在当前工作目录的插件数据目录写入含count个群的group_config.json（旧版结构，无schema_version）"""
+    os.makedirs(main.PLUGIN_DATA_DIR, exist_ok=True)
+    with open(main.GROUP_CONFIG_PATH, "w", encoding="utf-8") as f:
+        json.dump({"enabled_groups": build_groups(count, expired_ratio), "last_manual_push_time": ""},
+                  f, ensure_ascii=False, indent=4)
+
+
+fast_json_module = main.orjson  # 已安装orjson时可对比两种JSON后端
+
+
+@contextlib.contextmanager
+def json_backend(name: str):
+    """临时切换插件使用的JSON后端（json为标准库，orjson需已安装），结束后恢复"""
+    main.orjson = fast_json_module if name == "orjson" else None
+    try:
+        yield
+    finally:
+        main.orjson = fast_json_module
+
+
+@contextlib.contextmanager
+def workdir():
+    """切换到临时工作目录（插件数据目录为相对路径），结束后恢复并清理"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(previous)
+
+
+async def create_plugin(context=None, **config):
+    """实例化插件并执行异步初始化（与AstrBot加载插件的顺序一致），config覆盖BENCH_CONFIG中的默认值"""
+    plugin = main.AnnouncementPushPlugin(context or astrbot_stub.SimulatedContext(), {**BENCH_CONFIG, **config})
+    await plugin.initialize()
+    return plugin
+
+
+async def measure(scenario, memory: bool = True) -> dict:
+    """
+    执行scenario()（返回附加指标字典的协程函数）：先计时运行一次；memory=True时在tracemalloc下再运行一次取内存峰值
+    两次运行分开进行，tracemalloc的开销不会计入耗时
+    """
+    start = time.perf_counter()
+    extra = await scenario() or {}
+    result = {"seconds": time.perf_counter() - start, **extra}
+    if memory:
+        tracemalloc.start()
+        await scenario()
+        result["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
@@ -0,0 +1,224 @@
+"""
+公告推送插件离线压测：用模拟的AstrBot Context驱动插件，覆盖扇出推送、定时调度、配置加载/保存、启动加载（含旧数据迁移）、/pushconfig渲染、群消息被动刷新umo、多实例分片推送
+用法：python benchmarks/run_all.py [--sizes 10,100,1000,10000] [--scenarios fanout,scheduling,storage,startup,pushconfig,passive,coordination]
+                                  [--latency 0.005] [--jitter 0.0] [--error-rate 0.0] [--concurrency 50] [--workers 1,2,4]
+                                  [--no-memory] [--json result.json]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import harness
+from harness import astrbot_stub, main
+
+
+async def bench_fanout(size: int, args) -> dict:
+    async def scenario():
+        context = astrbot_stub.SimulatedContext(args.latency, args.jitter, args.error_rate, seed=size)
+        with harness.workdir():
+            plugin = await harness.create_plugin(context, push_concurrency=args.concurrency)
+            plugin.groups = main.GroupRegistry(harness.build_groups(size))
+            start = time.perf_counter()
+            await plugin._send_announcement_to_groups("压测公告：{date} 第{counter}个群")
+            elapsed = time.perf_counter() - start
+            stats = plugin.telemetry.to_dict()["platforms"].get("aiocqhttp", {})
+            await plugin.terminate()
+        return {
+            "groups_per_sec": size / elapsed if elapsed else 0.0,
+            "send_p50_ms": stats.get("p50_ms", 0),
+            "send_p99_ms": stats.get("p99_ms", 0),
+            "failed": context.failed,
+        }
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+async def bench_scheduling(size: int, args) -> dict:
+    specs = ["12:00", "daily@09:00", "weekly@1,3,5@18:30", "cron@*/15_9-17_*_*_1-5", "cron@0_8_1_*_*"]
+
+    async def scenario():
+        scheduler = main.TaskScheduler()
+        now = datetime.now()
+        cron_cache = {}
+        start = time.perf_counter()
+        for index in range(size):
+            task = {"task_id": f"task_{index}", **main.parse_schedule_spec(specs[index % len(specs)])}
+            scheduler.schedule(task["task_id"], main.compute_next_run(task, now, cron_cache).timestamp())
+        compute_seconds = time.perf_counter() - start
+
+        # 全部改期为已到期，测量调度器依次出堆触发的耗时
+        fired = []
+        done = asyncio.Event()
+
+        async def fire(task_id, due_ts):
+            fired.append(task_id)
+            if len(fired) == size:
+                done.set()
+
+        for index in range(size):
+            scheduler.schedule(f"task_{index}", time.time() - 1)
+        start = time.perf_counter()
+        runner = asyncio.create_task(scheduler.run(fire))
+        await asyncio.wait_for(done.wait(), timeout=60)
+        fire_seconds = time.perf_counter() - start
+        runner.cancel()
+        return {"next_run_us_per_task": compute_seconds / size * 1e6, "fire_us_per_task": fire_seconds / size * 1e6}
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+async def bench_storage(size: int, args) -> dict:
+    async def scenario():
+        with harness.workdir():
+            harness.write_group_config(size)
+            start = time.perf_counter()
+            plugin = await harness.create_plugin()
+            load_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            plugin._persist_groups()
+            await plugin.group_store.flush()
+            save_seconds = time.perf_counter() - start
+            await plugin.terminate()
+        return {"load_ms": load_seconds * 1000, "save_ms": save_seconds * 1000}
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+async def bench_startup(size: int, args) -> dict:
+    async def scenario():
+        result = {}
+        # 分别用标准库json与orjson（已安装时）测量：旧版数据首次加载（含一次性迁移写回）与迁移后的再次加载
+        for backend in ("json", "orjson") if harness.fast_json_module else ("json",):
+            with harness.json_backend(backend), harness.workdir():
+                harness.write_group_config(size)
+                start = time.perf_counter()
+                plugin = await harness.create_plugin()
+                result[f"{backend}_migrate_ms"] = (time.perf_counter() - start) * 1000
+                await plugin.terminate()
+                start = time.perf_counter()
+                plugin = await harness.create_plugin()
+                result[f"{backend}_load_ms"] = (time.perf_counter() - start) * 1000
+                assert len(plugin.groups) == size
+                await plugin.terminate()
+        return result
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+async def bench_pushconfig(size: int, args) -> dict:
+    async def scenario():
+        with harness.workdir():
+            plugin = await harness.create_plugin()
+            plugin.groups = main.GroupRegistry(harness.build_groups(size, expired_ratio=0.1))
+            event = astrbot_stub.SimulatedEvent()
+            start = time.perf_counter()
+            output = [text async for text in plugin.cmd_push_config(event)]
+            render_seconds = time.perf_counter() - start
+            # 翻到最后一页与过期群分页：验证分页渲染不随群数量线性增长
+            start = time.perf_counter()
+            last_page = [text async for text in plugin.cmd_push_config(event, "groups", size)]
+            expired_page = [text async for text in plugin.cmd_push_config(event, "expired", 1)]
+            page_seconds = time.perf_counter() - start
+            await plugin.terminate()
+        return {"render_ms": render_seconds * 1000, "output_chars": sum(len(text) for text in output),
+                "page_ms": page_seconds * 1000, "page_chars": max(len(text) for text in last_page + expired_page)}
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+async def bench_passive(size: int, args) -> dict:
+    async def scenario():
+        with harness.workdir():
+            plugin = await harness.create_plugin()
+            plugin.groups = main.GroupRegistry(harness.build_groups(size, expired_ratio=0.5))
+            # 一半消息来自未开启推送的群，一半来自已开启的群（其中一半umo已过期需刷新）
+            events = [astrbot_stub.SimulatedEvent(str(100000 + i)) for i in range(size)]
+            events += [astrbot_stub.SimulatedEvent(str(900000 + i)) for i in range(size)]
+            start = time.perf_counter()
+            for event in events:
+                await plugin.on_group_message(event)
+            first_seconds = time.perf_counter() - start
+            # 第二轮全部命中刷新间隔，只剩字典查找与时间比较
+            start = time.perf_counter()
+            for event in events:
+                await plugin.on_group_message(event)
+            second_seconds = time.perf_counter() - start
+            refreshed = plugin.passive_refresh_count
+            await plugin.group_store.flush()
+            flushes = plugin.group_store.metrics()["flush_count"]
+            await plugin.terminate()
+        return {"first_us_per_msg": first_seconds / len(events) * 1e6,
+                "throttled_us_per_msg": second_seconds / len(events) * 1e6,
+                "refreshed": refreshed, "flushes": flushes}
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+async def bench_coordination(size: int, args) -> dict:
+    async def scenario():
+        result = {}
+        # 同一进程内模拟多个实例共享协调数据库：各实例以相同run_key同时触发同一次推送（与定时任务到点一致）
+        for workers in [int(w) for w in args.workers.split(",")]:
+            context = astrbot_stub.SimulatedContext(args.latency, args.jitter, args.error_rate, seed=size)
+            with harness.workdir():
+                harness.write_group_config(size)
+                plugins = [await harness.create_plugin(context, push_concurrency=args.concurrency,
+                                                       coordination_mode="sqlite") for _ in range(workers)]
+                start = time.perf_counter()
+                await asyncio.gather(*(plugin._send_announcement_to_groups("压测公告", run_key="bench@1")
+                                       for plugin in plugins))
+                result[f"w{workers}_seconds"] = time.perf_counter() - start
+                result[f"w{workers}_sent"] = context.sent + context.failed  # 应恰好等于群数量（无重复发送）
+                for plugin in plugins:
+                    await plugin.terminate()
+        return result
+
+    return await harness.measure(scenario, not args.no_memory)
+
+
+SCENARIOS = {
+    "fanout": bench_fanout,
+    "scheduling": bench_scheduling,
+    "storage": bench_storage,
+    "startup": bench_startup,
+    "pushconfig": bench_pushconfig,
+    "passive": bench_passive,
+    "coordination": bench_coordination,
+}
+
+
+def format_row(size: int, result: dict) -> str:
+    cells = [f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in result.items()]
+    return f"  {size:>6}个 | " + "  ".join(cells)
+
+
+async def run(args) -> dict:
+    sizes = [int(size) for size in args.sizes.split(",")]
+    report = {"args": vars(args), "results": {}}
+    for name in args.scenarios.split(","):
+        print(f"[{name}]")
+        rows = report["results"][name] = {}
+        for size in sizes:
+            rows[size] = await SCENARIOS[name](size, args)
+            print(format_row(size, rows[size]), flush=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,5000,10000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟单次发送延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="模拟发送延迟的随机抖动上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟发送失败概率（0-1）")
+    parser.add_argument("--concurrency", type=int, default=50, help="push_concurrency并发上限")
+    parser.add_argument("--workers", default="1,2,4", help="coordination场景模拟的实例数量")
+    parser.add_argument("--no-memory", action="store_true", help="跳过tracemalloc内存峰值测量")
+    parser.add_argument("--json", help="将结果写入JSON文件，便于不同版本间对比")
+    cli_args = parser.parse_args()
+    result = asyncio.run(run(cli_args))
+    if cli_args.json:
+        with open(cli_args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
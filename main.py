@@ -5,23 +5,1633 @@ import astrbot.api.message_components as Comp
 import json
 import os
 import asyncio
+import bisect
+import heapq
+import itertools
+import re
+import secrets
+import sqlite3
+import tempfile
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import time as time_module
 from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+try:
+    import orjson  # 可选依赖：安装后数据文件的解析与序列化改用orjson（大文件快数倍），未安装时使用标准库json
+except ImportError:
+    orjson = None
 
 # 数据存储路径（遵循文档“持久化数据存data目录”规则🔶1-109）
 PLUGIN_DATA_DIR = os.path.join("data", "plugin_data", "astrbot_plugin_announcement_push")
 GROUP_CONFIG_PATH = os.path.join(PLUGIN_DATA_DIR, "group_config.json")
 SCHEDULED_CONFIG_PATH = os.path.join(PLUGIN_DATA_DIR, "scheduled_config.json")
+GROUP_JOURNAL_PATH = os.path.join(PLUGIN_DATA_DIR, "group_journal.log")  # 日志存储后端的追加写变更日志
+DELIVERY_QUEUE_PATH = os.path.join(PLUGIN_DATA_DIR, "delivery_queue.json")  # 推送任务投递进度（快照）
+DELIVERY_JOURNAL_PATH = os.path.join(PLUGIN_DATA_DIR, "delivery_queue.log")  # 推送队列的逐群状态变更日志
+COORDINATION_DB_PATH = os.path.join(PLUGIN_DATA_DIR, "coordination.db")  # 多实例协调的共享SQLite文件
+METRICS_EXPORT_PATHS = {  # 推送指标导出文件（按导出格式）
+    "json": os.path.join(PLUGIN_DATA_DIR, "push_metrics.json"),
+    "prometheus": os.path.join(PLUGIN_DATA_DIR, "push_metrics.prom"),
+}
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # 持久化数据中的时间字符串格式
+DATA_SCHEMA_VERSION = 2  # 数据文件结构版本：低于该版本（或无schema_version）的旧数据在加载时迁移一次
 
 # 默认配置结构（初始化用，符合文档“缺失配置补默认值”规则🔶1-369）
 DEFAULT_GROUP_CONFIG = {
     "enabled_groups": [],
     # 新增umo更新时间字段：[{"group_id": "xxx", "umo": "xxx", "add_time": "xxx", "umo_update_time": "xxx"}]
-    "last_manual_push_time": ""
+    "last_manual_push_time": "",
+    "schema_version": DATA_SCHEMA_VERSION
 }
 DEFAULT_SCHEDULED_CONFIG = {
     "scheduled_tasks": [],
-    "last_scheduled_push_time": ""
+    "last_scheduled_push_time": "",
+    "schema_version": DATA_SCHEMA_VERSION
 }
+DEFAULT_DELIVERY_QUEUE = {
+    # [{"job_id": "xxx", "content": "xxx", "source": "manual/task_xxx", "push_time": "xxx", "status": "running/done",
+    #   "groups": {"群ID": {"state": "pending/sent/failed/retrying", "attempts": 0, "next_retry": 0, "last_error": ""}},
+    #   "sent_count": 0}]  已完成任务只保留未送达的群，已送达的群折算为sent_count
+    "jobs": []
+}
+
+
+# ------------------------------ 推送限流：令牌桶+自适应退避（防止平台风控/封号） ------------------------------
+class TokenBucket:
+    """令牌桶限流器：rate为每秒补充的令牌数（<=0表示不限速），capacity为允许的突发发送量"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time_module.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取走一个令牌，令牌不足时按补充速率等待（加锁保证等待者按先来后到顺序放行）"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time_module.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendScheduler:
+    """
+    推送发送调度器：全局令牌桶+按平台令牌桶双重限流
+    遇到限流retcode时按平台乘性降速并指数退避重试，连续成功后逐步恢复到配置速率（AIMD）
+    """
+
+    MIN_RATE_RATIO = 0.1  # 自适应降速的下限（配置速率的10%）
+    RECOVER_RATIO = 0.05  # 每次成功恢复配置速率的5%
+    MAX_BACKOFF_SECONDS = 60
+
+    def __init__(self, global_rate: float, platform_rate: float, rate_limit_retcodes, max_retries: int):
+        self.global_bucket = TokenBucket(global_rate)
+        self.platform_rate = float(platform_rate)
+        self.platform_buckets = {}
+        self.rate_limit_retcodes = {str(code) for code in rate_limit_retcodes or []}
+        self.max_retries = max(0, int(max_retries))
+        self._paused_until = {}  # 平台 -> 退避结束的monotonic时间
+        self._strikes = {}  # 平台 -> 连续触发限流次数
+
+    @staticmethod
+    def platform_of(umo: str) -> str:
+        """从umo（平台:消息类型:会话ID）中提取平台标识"""
+        return str(umo).split(":", 1)[0]
+
+    def _bucket_for(self, platform: str) -> TokenBucket:
+        bucket = self.platform_buckets.get(platform)
+        if bucket is None:
+            bucket = self.platform_buckets[platform] = TokenBucket(self.platform_rate)
+        return bucket
+
+    def is_rate_limited(self, error: Exception) -> bool:
+        """判断异常是否为平台限流（retcode在配置的限流返回码列表中）"""
+        retcode = getattr(error, "retcode", None)
+        return retcode is not None and str(retcode) in self.rate_limit_retcodes
+
+    async def send(self, platform: str, send_func):
+        """按限流规则执行一次发送（send_func为返回协程的无参函数），限流失败时自动退避重试"""
+        bucket = self._bucket_for(platform)
+        for attempt in range(self.max_retries + 1):
+            pause = self._paused_until.get(platform, 0) - time_module.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                result = await send_func()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_rate_limited(e):
+                    raise
+                self._on_rate_limited(platform, bucket)
+                continue
+            self._on_success(platform, bucket)
+            return result
+
+    def _on_rate_limited(self, platform: str, bucket: TokenBucket):
+        strikes = self._strikes.get(platform, 0) + 1
+        self._strikes[platform] = strikes
+        if bucket.base_rate > 0:
+            bucket.rate = max(bucket.base_rate * self.MIN_RATE_RATIO, bucket.rate / 2)
+        backoff = min(self.MAX_BACKOFF_SECONDS, 2 ** (strikes - 1))
+        self._paused_until[platform] = time_module.monotonic() + backoff
+        logger.warning(f"平台{platform}触发限流：暂停{backoff}秒后重试，发送速率降至{bucket.rate:.2f}条/秒")
+
+    def _on_success(self, platform: str, bucket: TokenBucket):
+        self._strikes.pop(platform, None)
+        if bucket.rate < bucket.base_rate:
+            bucket.rate = min(bucket.base_rate, bucket.rate + bucket.base_rate * self.RECOVER_RATIO)
+
+
+# ------------------------------ 推送监控：单次发送延迟直方图、按平台/retcode计数 ------------------------------
+class RollingHistogram:
+    """
+    滚动延迟直方图：按分钟分槽（环形数组），记录为O(1)的桶计数累加，查询时合并窗口内的槽
+    同时保留进程启动以来的累计桶计数，供Prometheus格式导出
+    """
+
+    BUCKET_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+    def __init__(self, window_minutes: int = 60):
+        self.window_minutes = max(1, int(window_minutes))
+        self._slots = [None] * self.window_minutes  # [分钟序号, 桶计数, 总耗时ms, 次数]
+        self.lifetime_buckets = [0] * (len(self.BUCKET_BOUNDS_MS) + 1)
+        self.lifetime_sum_ms = 0.0
+        self.lifetime_count = 0
+
+    def record(self, seconds: float, now: float = None):
+        ms = seconds * 1000
+        bucket = bisect.bisect_left(self.BUCKET_BOUNDS_MS, ms)
+        minute = int((now if now is not None else time_module.time()) // 60)
+        slot = self._slots[minute % self.window_minutes]
+        if slot is None or slot[0] != minute:
+            slot = self._slots[minute % self.window_minutes] = [minute, [0] * len(self.lifetime_buckets), 0.0, 0]
+        slot[1][bucket] += 1
+        slot[2] += ms
+        slot[3] += 1
+        self.lifetime_buckets[bucket] += 1
+        self.lifetime_sum_ms += ms
+        self.lifetime_count += 1
+
+    def window_stats(self, now: float = None) -> dict:
+        """窗口内的次数、平均值与p50/p90/p99（取所在桶上界，超出最大桶记为最大桶上界）"""
+        current = int((now if now is not None else time_module.time()) // 60)
+        buckets = [0] * len(self.lifetime_buckets)
+        total_ms, count = 0.0, 0
+        for slot in self._slots:
+            if slot is not None and current - slot[0] < self.window_minutes:
+                buckets = [a + b for a, b in zip(buckets, slot[1])]
+                total_ms += slot[2]
+                count += slot[3]
+        stats = {"count": count, "avg_ms": round(total_ms / count, 1) if count else 0.0}
+        for name, q in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99)):
+            stats[name] = self._quantile(buckets, count, q)
+        return stats
+
+    def _quantile(self, buckets: list, count: int, q: float):
+        if not count:
+            return 0
+        threshold, cumulative = q * count, 0
+        for index, bucket_count in enumerate(buckets):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return self.BUCKET_BOUNDS_MS[min(index, len(self.BUCKET_BOUNDS_MS) - 1)]
+        return self.BUCKET_BOUNDS_MS[-1]
+
+
+class PushTelemetry:
+    """推送监控指标：单次发送延迟（按平台）、发送结果计数、失败retcode计数、整次扇出耗时"""
+
+    def __init__(self, window_minutes: int = 60):
+        self.window_minutes = window_minutes
+        self.started_at = time_module.time()
+        self.send_latency = {}  # 平台 -> RollingHistogram
+        self.fanout_latency = RollingHistogram(window_minutes)
+        self.send_counts = Counter()  # (平台, ok/fail) -> 次数
+        self.error_counts = Counter()  # (平台, retcode) -> 次数
+        self.fanout_groups = 0
+
+    def record_send(self, platform: str, seconds: float, retcode=None, failed: bool = False):
+        """记录一次context.send_message调用（failed=True时按retcode计入失败，无retcode记为unknown）"""
+        histogram = self.send_latency.get(platform)
+        if histogram is None:
+            histogram = self.send_latency[platform] = RollingHistogram(self.window_minutes)
+        histogram.record(seconds)
+        if failed:
+            self.send_counts[(platform, "fail")] += 1
+            self.error_counts[(platform, str(retcode) if retcode is not None else "unknown")] += 1
+        else:
+            self.send_counts[(platform, "ok")] += 1
+
+    def record_fanout(self, seconds: float, group_count: int):
+        self.fanout_latency.record(seconds)
+        self.fanout_groups += group_count
+
+    def to_dict(self) -> dict:
+        window_seconds = min(self.window_minutes * 60, max(60.0, time_module.time() - self.started_at))
+        platforms = {}
+        for platform, histogram in self.send_latency.items():
+            stats = histogram.window_stats()
+            stats["per_minute"] = round(stats["count"] / window_seconds * 60, 2)
+            stats["ok_total"] = self.send_counts[(platform, "ok")]
+            stats["fail_total"] = self.send_counts[(platform, "fail")]
+            stats["errors_by_retcode"] = {
+                retcode: cnt for (p, retcode), cnt in self.error_counts.items() if p == platform
+            }
+            platforms[platform] = stats
+        return {
+            "generated_at": datetime.now().strftime(TIME_FORMAT),
+            "uptime_seconds": round(time_module.time() - self.started_at),
+            "window_minutes": self.window_minutes,
+            "platforms": platforms,
+            "fanout": {**self.fanout_latency.window_stats(), "total": self.fanout_latency.lifetime_count,
+                       "groups_total": self.fanout_groups},
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式（计数器与直方图均为进程启动以来的累计值）"""
+        lines = [
+            "# TYPE announcement_push_sends_total counter",
+            *(f'announcement_push_sends_total{{platform="{p}",result="{r}"}} {c}'
+              for (p, r), c in sorted(self.send_counts.items())),
+            "# TYPE announcement_push_errors_total counter",
+            *(f'announcement_push_errors_total{{platform="{p}",retcode="{r}"}} {c}'
+              for (p, r), c in sorted(self.error_counts.items())),
+            "# TYPE announcement_push_send_seconds histogram",
+        ]
+        for platform, histogram in sorted(self.send_latency.items()):
+            lines.extend(self._prometheus_histogram("announcement_push_send_seconds", histogram, f'platform="{platform}",'))
+        lines.append("# TYPE announcement_push_fanout_seconds histogram")
+        lines.extend(self._prometheus_histogram("announcement_push_fanout_seconds", self.fanout_latency, ""))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _prometheus_histogram(name: str, histogram: RollingHistogram, labels: str) -> list:
+        lines, cumulative = [], 0
+        for bound, count in zip(histogram.BUCKET_BOUNDS_MS, histogram.lifetime_buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound / 1000}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {histogram.lifetime_count}')
+        lines.append(f"{name}_sum{{{labels.rstrip(',')}}} {histogram.lifetime_sum_ms / 1000:.6f}")
+        lines.append(f"{name}_count{{{labels.rstrip(',')}}} {histogram.lifetime_count}")
+        return lines
+
+
+# ------------------------------ 群推送列表：内存索引（按group_id O(1)查找，按umo更新时间有序） ------------------------------
+def _parse_time_to_ts(text: str):
+    """
+    将持久化的时间字符串解析为时间戳，解析失败返回None
+    符合TIME_FORMAT的19位字符串走fromisoformat快速路径（比strptime快一个数量级，万级群启动时差异明显）
+    """
+    try:
+        if len(text) == 19 and text[10] == " ":
+            return datetime.fromisoformat(text).timestamp()
+        return datetime.strptime(text, TIME_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# ------------------------------ 群标签：标签规范化与标签表达式解析 ------------------------------
+TAG_PATTERN = re.compile(r"^[^\s,，+;=]+$")
+
+
+def normalize_tags(text: str) -> list:
+    """解析逗号分隔的标签列表（去重、转小写、排序），标签不能含空白和, + ; =，且不能以-开头"""
+    tags = sorted({t.strip().lower() for t in re.split(r"[,，]", text or "") if t.strip()})
+    for tag in tags:
+        if not TAG_PATTERN.match(tag) or tag.startswith("-"):
+            raise ValueError(f"标签“{tag}”不合法：不能包含空白和, + ; =，且不能以-开头")
+    return tags
+
+
+def parse_tag_expr(expr: str) -> tuple:
+    """
+    解析标签表达式，返回(并集项列表, 排除标签集合)，每个并集项为需同时具备的标签元组：
+      a,b 含a或b的群 | a+b 同时含a和b的群 | -c 排除含c的群（只有排除项时从全部群中排除）
+    """
+    terms, excluded = [], set()
+    for part in re.split(r"[,，]", expr or ""):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if part.startswith("-"):
+            excluded.update(normalize_tags(part[1:]))
+        else:
+            term = tuple(normalize_tags(part.replace("+", ",")))
+            if term:
+                terms.append(term)
+    if not terms and not excluded:
+        raise ValueError("标签表达式为空，例：vip,新手群（并集）、vip+活跃（交集）、-测试（排除）")
+    return terms, excluded
+
+
+class GroupRecord:
+    """单个已开启推送的群（时间字段同时保存原始字符串与解析后的时间戳，推送时无需重复解析）"""
+
+    __slots__ = ("group_id", "umo", "add_time", "umo_update_time", "umo_update_ts", "tags", "extra")
+
+    KNOWN_FIELDS = ("group_id", "umo", "add_time", "umo_update_time", "tags")
+    KNOWN_FIELD_SET = frozenset(KNOWN_FIELDS)
+
+    def __init__(self, group_id: str, umo: str, add_time: str, umo_update_time: str, extra: dict = None,
+                 tags=()):
+        self.group_id = group_id
+        self.umo = umo
+        self.add_time = add_time
+        self.umo_update_time = umo_update_time
+        self.umo_update_ts = _parse_time_to_ts(umo_update_time)
+        self.tags = tuple(tags)  # 群标签（已规范化），用于分组推送
+        self.extra = extra or {}  # 未识别字段原样保留，保证写回JSON时不丢数据
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GroupRecord":
+        # 快速路径：只含已知字段的记录（迁移后的常见情况）无需逐字段筛选
+        extra = {} if data.keys() <= cls.KNOWN_FIELD_SET else \
+            {k: v for k, v in data.items() if k not in cls.KNOWN_FIELD_SET}
+        return cls(
+            str(data["group_id"]),
+            data.get("umo", ""),
+            data.get("add_time", ""),
+            data.get("umo_update_time", data.get("add_time", "")),
+            extra,
+            data.get("tags") or ()
+        )
+
+    def to_dict(self) -> dict:
+        """转换为group_config.json中enabled_groups的元素格式（无标签的群不写tags字段，与旧版格式一致）"""
+        data = {
+            "group_id": self.group_id,
+            "umo": self.umo,
+            "add_time": self.add_time,
+            "umo_update_time": self.umo_update_time,
+            **self.extra
+        }
+        if self.tags:
+            data["tags"] = list(self.tags)
+        return data
+
+
+class GroupRegistry:
+    """
+    群推送列表索引：主索引为group_id字典（保持添加顺序），辅助索引为按umo更新时间排序的列表
+    “当前umo有效的群”通过二分查找过期分界点得到，无需逐群解析时间
+    标签倒排索引（标签 -> 群ID集合）随增删改增量维护，解析标签表达式只做集合运算，无需遍历全部群
+    """
+
+    def __init__(self, groups=()):
+        self._records = {}  # group_id -> GroupRecord
+        self._expiry_index = []  # 有序列表：(umo_update_ts, group_id)，仅含umo与时间均可用的群
+        self._unusable = set()  # umo缺失或时间无法解析的群（始终视为无效）
+        self._tag_index = {}  # 标签 -> 含该标签的群ID集合
+        # 批量载入：先建主索引（重复group_id后者覆盖前者，与upsert一致），再一次性排序过期索引，避免逐条insort
+        for data in groups:
+            record = GroupRecord.from_dict(data)
+            self._records[record.group_id] = record
+        for record in self._records.values():
+            if record.umo and record.umo_update_ts is not None:
+                self._expiry_index.append((record.umo_update_ts, record.group_id))
+            else:
+                self._unusable.add(record.group_id)
+            self._tags_add(record)
+        self._expiry_index.sort()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, group_id) -> bool:
+        return group_id in self._records
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def get(self, group_id: str):
+        return self._records.get(group_id)
+
+    def _index_add(self, record: GroupRecord):
+        if record.umo and record.umo_update_ts is not None:
+            bisect.insort(self._expiry_index, (record.umo_update_ts, record.group_id))
+        else:
+            self._unusable.add(record.group_id)
+
+    def _tags_add(self, record: GroupRecord):
+        for tag in record.tags:
+            self._tag_index.setdefault(tag, set()).add(record.group_id)
+
+    def _tags_remove(self, record: GroupRecord):
+        for tag in record.tags:
+            members = self._tag_index.get(tag)
+            if members is not None:
+                members.discard(record.group_id)
+                if not members:
+                    del self._tag_index[tag]
+
+    def _index_remove(self, record: GroupRecord):
+        if record.group_id in self._unusable:
+            self._unusable.discard(record.group_id)
+            return
+        key = (record.umo_update_ts, record.group_id)
+        pos = bisect.bisect_left(self._expiry_index, key)
+        if pos < len(self._expiry_index) and self._expiry_index[pos] == key:
+            del self._expiry_index[pos]
+
+    def upsert(self, record: GroupRecord):
+        """新增群或整体替换同group_id的群记录"""
+        old = self._records.get(record.group_id)
+        if old is not None:
+            self._index_remove(old)
+            self._tags_remove(old)
+        self._records[record.group_id] = record
+        self._index_add(record)
+        self._tags_add(record)
+
+    def refresh_umo(self, group_id: str, umo: str, update_time: str):
+        """更新群的umo与更新时间，返回更新后的记录（群不存在返回None）"""
+        record = self._records.get(group_id)
+        if record is None:
+            return None
+        self._index_remove(record)
+        record.umo = umo
+        record.umo_update_time = update_time
+        record.umo_update_ts = _parse_time_to_ts(update_time)
+        self._index_add(record)
+        return record
+
+    def remove(self, group_id: str):
+        """移除群，返回被移除的记录（群不存在返回None）"""
+        record = self._records.pop(group_id, None)
+        if record is not None:
+            self._index_remove(record)
+            self._tags_remove(record)
+        return record
+
+    def set_tags(self, group_id: str, tags):
+        """替换群的标签并增量更新倒排索引，返回更新后的记录（群不存在返回None）"""
+        record = self._records.get(group_id)
+        if record is None:
+            return None
+        self._tags_remove(record)
+        record.tags = tuple(tags)
+        self._tags_add(record)
+        return record
+
+    def tag_counts(self) -> dict:
+        """各标签下的群数量（按标签名排序）"""
+        return {tag: len(self._tag_index[tag]) for tag in sorted(self._tag_index)}
+
+    def resolve_tags(self, expr: str) -> list:
+        """按标签表达式解析目标群ID（按群ID排序）：各交集项取倒排索引中最小集合起做交集，再求并集并排除"""
+        terms, excluded = parse_tag_expr(expr)
+        if terms:
+            matched = set()
+            for term in terms:
+                sets = sorted((self._tag_index.get(tag, set()) for tag in term), key=len)
+                matched |= sets[0].intersection(*sets[1:])
+        else:
+            matched = set(self._records)
+        for tag in excluded:
+            matched -= self._tag_index.get(tag, set())
+        return sorted(matched)
+
+    def _expiry_cut(self, expire_seconds: float, now: float = None) -> int:
+        deadline = (now if now is not None else time_module.time()) - expire_seconds
+        return bisect.bisect_left(self._expiry_index, (deadline, ""))
+
+    def iter_valid(self, expire_seconds: float, now: float = None):
+        """惰性遍历umo有效的群（按umo更新时间升序），配合itertools.islice只取需要的部分"""
+        cut = self._expiry_cut(expire_seconds, now)
+        return (self._records[self._expiry_index[i][1]] for i in range(cut, len(self._expiry_index)))
+
+    def iter_invalid(self, expire_seconds: float, now: float = None):
+        """惰性遍历umo无效的群（缺失/无法解析的群在前，其后按umo更新时间升序）"""
+        cut = self._expiry_cut(expire_seconds, now)
+        return itertools.chain(
+            (self._records[gid] for gid in list(self._unusable)),
+            (self._records[self._expiry_index[i][1]] for i in range(cut))
+        )
+
+    def is_valid(self, group_id: str, expire_seconds: float, now: float = None) -> bool:
+        """单个群的umo是否存在且未过期（与valid_groups的分界一致，分组推送时只检查目标群）"""
+        record = self._records.get(group_id)
+        if record is None or group_id in self._unusable:
+            return False
+        return record.umo_update_ts >= (now if now is not None else time_module.time()) - expire_seconds
+
+    def count_valid(self, expire_seconds: float, now: float = None) -> int:
+        return len(self._expiry_index) - self._expiry_cut(expire_seconds, now)
+
+    def count_invalid(self, expire_seconds: float, now: float = None) -> int:
+        return len(self._unusable) + self._expiry_cut(expire_seconds, now)
+
+    def valid_groups(self, expire_seconds: float, now: float = None) -> list:
+        """umo存在且未过期的群（按umo更新时间升序）"""
+        cut = self._expiry_cut(expire_seconds, now)
+        return [self._records[gid] for _, gid in self._expiry_index[cut:]]
+
+    def invalid_groups(self, expire_seconds: float, now: float = None) -> list:
+        """umo缺失、时间无法解析或已过期的群"""
+        cut = self._expiry_cut(expire_seconds, now)
+        return [self._records[gid] for gid in self._unusable] + \
+            [self._records[gid] for _, gid in self._expiry_index[:cut]]
+
+    def to_list(self) -> list:
+        """导出为group_config.json的enabled_groups格式（保持添加顺序）"""
+        return [record.to_dict() for record in self._records.values()]
+
+
+# ------------------------------ 持久化：线程池写盘+防抖合并+原子替换 ------------------------------
+def _json_loads(raw):
+    """解析JSON文本/字节（已安装orjson时使用orjson）"""
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _json_dumps(data, pretty: bool = True) -> str:
+    """
+    序列化为JSON文本（保留中文）：pretty为带缩进的数据文件格式，否则为单行（日志事件）
+    已安装orjson时使用orjson（缩进为2），否则使用标准库json（缩进为4，与旧版格式一致）
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, option=option).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=4 if pretty else None)
+
+
+def _read_json_file(path: str):
+    """以二进制读取并解析JSON文件（省去解码为str的一次复制，orjson可直接解析字节）"""
+    with open(path, "rb") as f:
+        return _json_loads(f.read())
+
+
+def _write_json_atomic(path: str, data: dict):
+    """以带缩进、保留中文的格式原子写入JSON文件"""
+    _write_text_atomic(path, _json_dumps(data))
+
+
+def _write_text_atomic(path: str, text: str):
+    """先写同目录临时文件并fsync，再os.replace原子替换，写入中途崩溃不会损坏原文件"""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DebouncedJsonStore:
+    """
+    JSON配置文件的防抖写盘器：mark_dirty()只登记变更，delay秒内的多次变更合并为一次落盘
+    落盘时在事件循环线程取快照（snapshot返回独立的新字典），序列化与写文件在线程池执行
+    """
+
+    def __init__(self, path: str, label: str, snapshot, delay: float = 1.0):
+        self.path = path
+        self.label = label  # 日志中的名称，如“群配置”
+        self.snapshot = snapshot
+        self.delay = max(0.0, float(delay))
+        self._dirty = False
+        self._timer = None
+        self._lock = asyncio.Lock()
+        # 写盘指标
+        self.flush_count = 0
+        self.fail_count = 0
+        self.coalesced_count = 0  # 被合并（未单独落盘）的变更次数
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def write_now(self, data: dict) -> bool:
+        """同步原子写入（仅用于事件循环外，如加载失败时写入默认配置），返回是否写入成功"""
+        try:
+            _write_json_atomic(self.path, data)
+            logger.info(f"{self.label}保存成功")
+            return True
+        except Exception as e:
+            logger.error(f"保存{self.label}失败：{str(e)}")
+            return False
+
+    def mark_dirty(self, event: dict = None):
+        """登记一次变更（event为变更事件，整文件重写模式下忽略），delay秒后统一落盘；无运行中的事件循环时直接同步写入"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.write_now(self.snapshot())
+            return
+        if self._dirty:
+            self.coalesced_count += 1
+        self._dirty = True
+        if self._timer is None:
+            self._timer = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """立即落盘待写变更（无变更时直接返回）"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = self.snapshot()
+            start = time_module.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, _write_json_atomic, self.path, data)
+            except Exception as e:
+                self._dirty = True  # 保留脏标记，下次变更或关闭时重试
+                self.fail_count += 1
+                logger.error(f"保存{self.label}失败：{str(e)}")
+                return
+            latency = time_module.perf_counter() - start
+            self.flush_count += 1
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+            logger.debug(f"{self.label}保存成功（耗时{latency * 1000:.1f}ms）")
+
+    def metrics(self) -> dict:
+        return {
+            "flush_count": self.flush_count,
+            "fail_count": self.fail_count,
+            "coalesced_count": self.coalesced_count,
+            "last_latency_ms": round(self.last_latency * 1000, 2),
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+            "avg_latency_ms": round(self.total_latency / self.flush_count * 1000, 2) if self.flush_count else 0.0,
+        }
+
+
+def read_journal_events(journal_path: str, label: str):
+    """逐行读取追加写日志中的事件（跳过崩溃时只写了一半的行）"""
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield _json_loads(line)
+            except ValueError:
+                logger.warning(f"{label}日志第{line_no}行损坏，已跳过")
+
+
+def migrate_group_config(config: dict) -> dict:
+    """将旧版群配置迁移到当前结构（群ID统一为字符串、补全umo/umo_update_time），写入schema_version"""
+    for group in config.get("enabled_groups", []):
+        group["group_id"] = str(group["group_id"])
+        group.setdefault("umo", "")
+        if "umo_update_time" not in group:
+            group["umo_update_time"] = group.get("add_time", "")
+    config.setdefault("last_manual_push_time", "")
+    config["schema_version"] = DATA_SCHEMA_VERSION
+    return config
+
+
+def migrate_scheduled_config(config: dict) -> dict:
+    """将旧版定时任务配置迁移到当前结构（旧任务补全repeat=once），写入schema_version"""
+    for task in config.get("scheduled_tasks", []):
+        task.setdefault("repeat", "once")
+    config.setdefault("last_scheduled_push_time", "")
+    config["schema_version"] = DATA_SCHEMA_VERSION
+    return config
+
+
+def replay_group_journal(config: dict, journal_path: str) -> int:
+    """将追加写日志中的群变更事件按顺序重放到config（group_config.json格式），返回重放的事件数"""
+    if not os.path.exists(journal_path):
+        return 0
+    groups = {str(g["group_id"]): g for g in config.get("enabled_groups", [])}
+    replayed = 0
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                event = _json_loads(line)
+            except ValueError:
+                # 崩溃时最后一行可能只写了一半，跳过即可（该变更未完整落盘）
+                logger.warning(f"群变更日志第{line_no}行损坏，已跳过")
+                continue
+            try:
+                op = event.get("op")
+                if op == "add":
+                    groups[event["group"]["group_id"]] = event["group"]
+                elif op == "refresh" and event["group_id"] in groups:
+                    groups[event["group_id"]].update(event["fields"])
+                elif op == "remove":
+                    groups.pop(event["group_id"], None)
+                elif op == "meta":
+                    config.update(event["data"])
+            except (KeyError, TypeError, AttributeError):
+                # 能解析但缺字段/类型不符的事件同样跳过，不能让单行坏数据导致整个群配置回退为默认值
+                logger.warning(f"群变更日志第{line_no}行事件格式错误，已跳过")
+                continue
+            replayed += 1
+    config["enabled_groups"] = list(groups.values())
+    return replayed
+
+
+class JournalStore:
+    """
+    日志存储后端（群配置、推送队列）：每次变更只向日志文件追加一行事件，单次变更I/O为O(1)
+    事件数超过compact_threshold或插件停用时压缩：写入完整快照（如group_config.json）后清空日志
+    compact_threshold可为返回阈值的函数（按数据规模放大阈值，压缩的开销均摊到每次变更为O(1)）
+    对外接口与DebouncedJsonStore一致（mark_dirty/flush/write_now/metrics）
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str, label: str, snapshot,
+                 delay: float = 1.0, compact_threshold: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.label = label
+        self.snapshot = snapshot
+        self.delay = max(0.0, float(delay))
+        self.compact_threshold = compact_threshold
+        self._pending = []  # 待追加的事件行
+        self._need_compact = False
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self.journal_events = 0  # 当前日志中的事件数（启动时由重放结果设置）
+        # 写盘指标
+        self.flush_count = 0
+        self.fail_count = 0
+        self.coalesced_count = 0
+        self.compact_count = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def write_now(self, data: dict) -> bool:
+        """同步写入完整快照并清空日志（仅用于事件循环外），返回是否写入成功"""
+        try:
+            self._compact_sync(data)
+            logger.info(f"{self.label}保存成功")
+            return True
+        except Exception as e:
+            logger.error(f"保存{self.label}失败：{str(e)}")
+            return False
+
+    def _compact_sync(self, data: dict):
+        # 先原子写快照再清空日志：两步之间崩溃时，重放旧日志是幂等的
+        _write_json_atomic(self.snapshot_path, data)
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+
+    def _append_sync(self, lines: list):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def mark_dirty(self, event: dict = None):
+        """登记一次变更：有事件则追加到日志，无事件（未知变更）则在下次落盘时写完整快照"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.write_now(self.snapshot())
+            return
+        if self._pending or self._need_compact:
+            self.coalesced_count += 1
+        if event is None:
+            self._need_compact = True
+        else:
+            self._pending.append(_json_dumps(event, pretty=False) + "\n")
+        if self._timer is None:
+            self._timer = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self, compact: bool = False):
+        """追加待写事件；日志过长、存在未知变更或compact=True时压缩为快照"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            lines, self._pending = self._pending, []
+            threshold = self.compact_threshold() if callable(self.compact_threshold) else self.compact_threshold
+            compact = compact or self._need_compact or \
+                self.journal_events + len(lines) >= max(1, int(threshold))
+            if not lines and not (compact and (self._need_compact or self.journal_events)):
+                return
+            self._need_compact = False
+            loop = asyncio.get_running_loop()
+            start = time_module.perf_counter()
+            try:
+                if compact:
+                    await loop.run_in_executor(None, self._compact_sync, self.snapshot())
+                    self.journal_events = 0
+                    self.compact_count += 1
+                else:
+                    await loop.run_in_executor(None, self._append_sync, lines)
+                    self.journal_events += len(lines)
+            except Exception as e:
+                self._pending = lines + self._pending  # 保留未落盘事件，下次重试
+                self._need_compact = self._need_compact or compact
+                self.fail_count += 1
+                logger.error(f"保存{self.label}失败：{str(e)}")
+                return
+            latency = time_module.perf_counter() - start
+            self.flush_count += 1
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+            logger.debug(f"{self.label}{'压缩' if compact else '追加'}成功（耗时{latency * 1000:.1f}ms）")
+
+    def metrics(self) -> dict:
+        return {
+            "flush_count": self.flush_count,
+            "fail_count": self.fail_count,
+            "coalesced_count": self.coalesced_count,
+            "compact_count": self.compact_count,
+            "journal_events": self.journal_events,
+            "last_latency_ms": round(self.last_latency * 1000, 2),
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+            "avg_latency_ms": round(self.total_latency / self.flush_count * 1000, 2) if self.flush_count else 0.0,
+        }
+
+
+# ------------------------------ 公告模板：预编译消息链，群间共享不变部分 ------------------------------
+class AnnouncementTemplate:
+    """
+    公告消息模板：每次推送只编译一次，生成带@全体/不带@全体两种消息链变体
+    支持占位符：{date}/{time}（推送日期/时间，编译时直接替换）、{group_id}/{counter}（群ID/本次推送中的序号，逐群替换）
+    不含逐群占位符时所有群共享同一消息链对象（只读，发送后不得修改）；其余花括号原样保留
+    """
+
+    __slots__ = ("per_group", "_format", "_at_component", "_chain_with_at", "_chain_plain")
+
+    PLACEHOLDER_PATTERN = re.compile(r"\{(group_id|counter|date|time)\}")
+    PER_GROUP_FIELDS = ("group_id", "counter")
+
+    def __init__(self, content: str, push_time: str, allow_at_all: bool = True):
+        push_dt = datetime.strptime(push_time, TIME_FORMAT)
+        per_push = {"date": push_dt.strftime("%Y-%m-%d"), "time": push_dt.strftime("%H:%M")}
+        body = f"【管理员公告】\n{content}\n\n推送时间：{push_time}"
+
+        # 拆分为字面量与占位符：推送级占位符立即替换，逐群占位符编译为str.format格式串
+        pieces = []
+        self.per_group = False
+        for index, piece in enumerate(self.PLACEHOLDER_PATTERN.split(body)):
+            if index % 2 == 0:
+                pieces.append(piece.replace("{", "{{").replace("}", "}}"))
+            elif piece in per_push:
+                pieces.append(per_push[piece].replace("{", "{{").replace("}", "}}"))
+            else:
+                pieces.append("{" + piece + "}")
+                self.per_group = True
+        self._format = "".join(pieces)
+
+        # @全体成员组件全局只创建一次（仅AIOCQHTTP支持，创建失败则只提供无@变体🔶1-98）
+        self._at_component = None
+        if allow_at_all:
+            try:
+                self._at_component = Comp.At(qq="all")
+            except Exception as e:
+                logger.warning(f"添加@全体成员失败（无权限/平台限制）：{str(e)}，降级为普通消息")
+        self._chain_with_at = None
+        self._chain_plain = None
+        if not self.per_group:
+            text = self._format.format()  # 无占位符时format()仅还原转义的花括号
+            self._chain_plain = self._build_chain(text, with_at=False)
+            if self._at_component is not None:
+                self._chain_with_at = self._build_chain(text, with_at=True)
+
+    @property
+    def has_at_variant(self) -> bool:
+        return self._at_component is not None
+
+    def _build_chain(self, text: str, with_at: bool) -> MessageChain:
+        message_chain = MessageChain()
+        if with_at:
+            message_chain.chain.append(self._at_component)
+            message_chain.chain.append(Comp.Plain("\n" + text))  # @后换行，保持原有排版
+        else:
+            message_chain.chain.append(Comp.Plain(text))
+        return message_chain
+
+    def chain_for(self, group_id: str, counter: int, with_at: bool) -> MessageChain:
+        """取某个群的消息链：无逐群占位符时直接返回共享的预编译链"""
+        with_at = with_at and self._at_component is not None
+        if not self.per_group:
+            return self._chain_with_at if with_at else self._chain_plain
+        return self._build_chain(self._format.format(group_id=group_id, counter=counter), with_at)
+
+
+class AtAllCapabilityCache:
+    """
+    @全体成员能力缓存：按(平台, 群ID)记录@全体是否发送成功，条目在ttl秒后过期重新探测
+    已知被拒绝的群直接发送无@变体，避免每次推送都先失败一次
+    只有retcode在reject_retcodes中的失败才视为@全体被拒绝（超时等其他错误不降级，走普通重试）
+    """
+
+    def __init__(self, ttl_seconds: float, reject_retcodes=()):
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.reject_retcodes = {str(code) for code in reject_retcodes or []}
+        self._entries = {}  # (平台, 群ID) -> (是否支持, 过期时间戳)
+
+    def is_rejection(self, error: Exception) -> bool:
+        """判断带@全体发送的异常是否为平台拒绝@全体（retcode在配置的返回码列表中）"""
+        retcode = getattr(error, "retcode", None)
+        return retcode is not None and str(retcode) in self.reject_retcodes
+
+    def should_try(self, platform: str, group_id: str) -> bool:
+        entry = self._entries.get((platform, group_id))
+        if entry is None:
+            return True
+        supported, expires_at = entry
+        if expires_at <= time_module.time():
+            del self._entries[(platform, group_id)]
+            return True
+        return supported
+
+    def record(self, platform: str, group_id: str, supported: bool):
+        self._entries[(platform, group_id)] = (supported, time_module.time() + self.ttl_seconds)
+
+    def forget(self, platform: str, group_id: str):
+        self._entries.pop((platform, group_id), None)
+
+    def summary(self) -> dict:
+        """清理过期条目并按平台统计：{平台: {"supported": [群ID], "rejected": [群ID]}}"""
+        now = time_module.time()
+        result = {}
+        for (platform, group_id), (supported, expires_at) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[(platform, group_id)]
+                continue
+            bucket = result.setdefault(platform, {"supported": [], "rejected": []})
+            bucket["supported" if supported else "rejected"].append(group_id)
+        return result
+
+
+# ------------------------------ 持久化推送队列：按群记录投递状态，支持重启续推与失败重试 ------------------------------
+class DeliveryQueue:
+    """
+    推送任务队列：每条公告对应一个job，每个群的状态为pending/sent/failed/retrying
+    可重试的失败按指数退避（base_delay×2^(n-1)秒）重试，超过max_attempts次后置为failed
+    每次变更生成一条事件交给listener（日志存储逐行追加），启动时用apply()按顺序重放日志
+    任务完成后已送达的群折算为sent_count，只保留失败/重试中的群，快照大小与运行中任务的群数相当
+    """
+
+    KEEP_FINISHED_JOBS = 20  # 已完成任务最多保留条数（供/pushjobs查看）
+    STATE_LABELS = {"pending": "待发送", "sent": "已送达", "failed": "失败", "retrying": "重试中"}
+
+    def __init__(self, data: dict, max_attempts: int = 3, base_delay: float = 30):
+        self.jobs = {job["job_id"]: job for job in data.get("jobs", [])}
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = max(0.0, float(base_delay))
+        self.listener = None  # 变更事件回调（如JournalStore.mark_dirty）
+        for job in self.jobs.values():
+            if job["status"] == "done":
+                self._collapse_sent(job)  # 兼容旧版快照中保留了全部群状态的已完成任务
+
+    def _emit(self, event: dict):
+        if self.listener is not None:
+            self.listener(event)
+
+    def snapshot(self) -> dict:
+        """导出队列快照（逐群复制状态，写盘线程不与事件循环共享可变对象），仅在日志压缩时调用"""
+        return {"jobs": [
+            {**job, "groups": {gid: dict(state) for gid, state in job["groups"].items()}}
+            for job in self.jobs.values()
+        ]}
+
+    def state_count(self) -> int:
+        """队列中保存的群状态条数（即快照规模）"""
+        return sum(len(job["groups"]) for job in self.jobs.values())
+
+    def apply(self, event: dict):
+        """重放一条变更事件（与各修改方法生成的事件一一对应）"""
+        op = event.get("op")
+        if op == "job":
+            self.jobs[event["job"]["job_id"]] = event["job"]
+            return
+        job = self.jobs.get(event.get("job_id"))
+        if job is None:
+            return
+        if op == "mark":
+            job["groups"][event["group_id"]] = event["state"]
+        elif op == "reset":
+            for gid in event["group_ids"]:
+                if gid in job["groups"]:
+                    job["groups"][gid].update({"state": "pending", "attempts": 0, "next_retry": 0})
+            job["status"] = "running"
+        elif op == "status":
+            job["status"] = event["status"]
+            if job["status"] == "done":
+                self._collapse_sent(job)
+        elif op == "drop":
+            del self.jobs[job["job_id"]]
+
+    @staticmethod
+    def _collapse_sent(job: dict):
+        """已完成任务：已送达的群折算为计数，只保留失败的群（供/pushjobs明细与/pushretry）"""
+        sent = [gid for gid, state in job["groups"].items() if state["state"] == "sent"]
+        for gid in sent:
+            del job["groups"][gid]
+        job["sent_count"] = job.get("sent_count", 0) + len(sent)
+
+    def create_job(self, content: str, source: str, push_time: str, group_ids, tags: str = "") -> dict:
+        job_id = f"job_{time_module.time() * 1000:.0f}"
+        while job_id in self.jobs:
+            job_id += "_1"
+        job = {
+            "job_id": job_id,
+            "content": content,
+            "source": source,
+            "push_time": push_time,
+            "status": "running",
+            "tags": tags,  # 目标标签表达式（空为全部群）
+            "groups": {gid: {"state": "pending", "attempts": 0, "next_retry": 0, "last_error": ""} for gid in group_ids}
+        }
+        self.jobs[job_id] = job
+        self._emit({"op": "job", "job": job})
+        self._prune()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] == "done"]
+        for job_id in finished[:max(0, len(finished) - self.KEEP_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+            self._emit({"op": "drop", "job_id": job_id})
+
+    def targets(self, job: dict, states, now: float) -> list:
+        """处于指定状态的群ID（retrying状态仅返回已到重试时间的群）"""
+        return [
+            gid for gid, state in job["groups"].items()
+            if state["state"] in states and (state["state"] != "retrying" or state["next_retry"] <= now)
+        ]
+
+    def mark(self, job: dict, group_id: str, error: str = None, retryable: bool = True, now: float = None) -> str:
+        """记录一次投递结果（error为None表示成功），返回该群的新状态"""
+        state = job["groups"][group_id]
+        state["attempts"] += 1
+        if error is None:
+            state.update({"state": "sent", "last_error": ""})
+        elif retryable and state["attempts"] < self.max_attempts:
+            delay = self.base_delay * 2 ** (state["attempts"] - 1)
+            state.update({"state": "retrying", "next_retry": (now or time_module.time()) + delay, "last_error": error})
+        else:
+            state.update({"state": "failed", "last_error": error})
+        self._emit({"op": "mark", "job_id": job["job_id"], "group_id": group_id, "state": state})
+        return state["state"]
+
+    def reset_failed(self, job: dict) -> list:
+        """将失败的群重置为待发送（重新计算重试次数），返回重置的群ID"""
+        reset = []
+        for gid, state in job["groups"].items():
+            if state["state"] == "failed":
+                state.update({"state": "pending", "attempts": 0, "next_retry": 0})
+                reset.append(gid)
+        if reset:
+            job["status"] = "running"
+            self._emit({"op": "reset", "job_id": job["job_id"], "group_ids": reset})
+        return reset
+
+    def next_retry_at(self, job: dict):
+        retry_times = [s["next_retry"] for s in job["groups"].values() if s["state"] == "retrying"]
+        return min(retry_times) if retry_times else None
+
+    def progress(self, job: dict) -> dict:
+        counts = dict.fromkeys(self.STATE_LABELS, 0)
+        for state in job["groups"].values():
+            counts[state["state"]] += 1
+        counts["sent"] += job.get("sent_count", 0)
+        return counts
+
+    def refresh_status(self, job: dict):
+        counts = self.progress(job)
+        status = "running" if counts["pending"] or counts["retrying"] else "done"
+        if status != job["status"]:
+            job["status"] = status
+            if status == "done":
+                self._collapse_sent(job)
+            self._emit({"op": "status", "job_id": job["job_id"], "status": status})
+
+    def unfinished_jobs(self) -> list:
+        return [job for job in self.jobs.values() if job["status"] != "done"]
+
+
+# ------------------------------ 定时规则：一次性/每天/每周/cron表达式（增量计算下次执行时间） ------------------------------
+class CronExpression:
+    """
+    标准5段cron表达式（分 时 日 月 周），各段支持 * 、a-b 、*/n 、a-b/n 及逗号列表
+    周字段0和7均表示周日；日与周同时受限（都不以*开头）时按cron惯例取“或”
+    """
+
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError("cron表达式需为5段：分 时 日 月 周")
+        self.expr = " ".join(parts)
+        fields = [self._parse_field(part, low, high) for part, (low, high) in zip(parts, self.FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {d % 7 for d in weekdays}  # 统一为0=周日
+        # 与标准cron（vixie cron）一致：以*开头的字段（含*/n）视为不受限，日与周取“与”
+        self.days_restricted = not parts[2].startswith("*")
+        self.weekdays_restricted = not parts[4].startswith("*")
+        self._sorted_minutes = sorted(self.minutes)
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> set:
+        values = set()
+        for item in part.split(","):
+            rng, _, step = item.partition("/")
+            step = int(step) if step else 1
+            if rng == "*":
+                start, end = low, high
+            elif "-" in rng:
+                start, end = map(int, rng.split("-", 1))
+            else:
+                start = end = int(rng)
+            if not (low <= start <= end <= high) or step <= 0:
+                raise ValueError(f"cron字段“{item}”超出范围{low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        dom_ok = day.day in self.days
+        dow_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return dom_ok or dow_ok
+        return dom_ok and dow_ok
+
+    def next_after(self, after: datetime):
+        """严格晚于after的下一个匹配时刻：按月/日/时跳跃推进，不逐分钟枚举；5年内无匹配返回None"""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            pos = bisect.bisect_left(self._sorted_minutes, t.minute)
+            if pos == len(self._sorted_minutes):
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=self._sorted_minutes[pos])
+        return None
+
+
+REPEAT_LABELS = {"once": "一次性", "daily": "每天", "weekly": "每周", "cron": "cron"}
+WEEKDAY_LABELS = "一二三四五六日"
+
+
+def _parse_hhmm(text: str):
+    hour, minute = map(int, text.split(":"))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError("时间需在0-23时、0-59分范围内")
+    return hour, minute
+
+
+def parse_schedule_spec(spec: str) -> dict:
+    """
+    解析定时指令的时间参数，返回写入任务的调度字段：
+      12:00 | daily@12:00 | weekly@1,3,5@12:00 | cron@0_9_*_*_1-5（cron各段用下划线分隔）
+      可追加选项：;until=2026-12-31（截止日期，含当天） ;tz=Asia/Shanghai（时区） ;tags=vip+活跃,-测试（目标标签）
+    """
+    rule, *options = spec.strip().split(";")
+    kind, _, rest = rule.partition("@")
+    if not rest:
+        kind, rest = "once", rule
+    kind = {"每天": "daily", "每周": "weekly"}.get(kind, kind.lower())
+    fields = {"repeat": kind}
+    if kind in ("once", "daily"):
+        _parse_hhmm(rest)
+        fields["time"] = rest
+    elif kind == "weekly":
+        days_text, _, hhmm = rest.rpartition("@")
+        _parse_hhmm(hhmm)
+        weekdays = sorted({int(d) for d in days_text.replace("，", ",").split(",") if d})
+        if not weekdays or not all(1 <= d <= 7 for d in weekdays):
+            raise ValueError("每周规则需指定1-7的星期（1=周一），例：weekly@1,3,5@09:00")
+        fields.update({"time": hhmm, "weekdays": weekdays})
+    elif kind == "cron":
+        fields["cron"] = CronExpression(rest.replace("_", " ")).expr
+    else:
+        raise ValueError(f"未知的重复规则“{kind}”，可选：daily、weekly、cron")
+    for option in options:
+        key, _, value = option.partition("=")
+        key, value = key.strip(), value.strip()
+        if key == "until":
+            datetime.strptime(value, "%Y-%m-%d")
+            fields["end_date"] = value
+        elif key == "tz":
+            ZoneInfo(value)
+            fields["timezone"] = value
+        elif key == "tags":
+            parse_tag_expr(value)
+            fields["tags"] = value
+        elif key:
+            raise ValueError(f"未知选项“{key}”，可选：until、tz、tags")
+    return fields
+
+
+def compute_next_run(task: dict, after: datetime, cron_cache: dict = None):
+    """
+    按任务规则计算严格晚于after（本机时间）的下次执行时间，返回本机时间；超过截止日期返回None
+    旧版任务没有repeat字段，视为一次性HH:MM任务；cron_cache用于复用已解析的表达式
+    """
+    tz = ZoneInfo(task["timezone"]) if task.get("timezone") else None
+    local_after = after.astimezone(tz).replace(tzinfo=None) if tz else after  # 换算到任务时区的挂钟时间
+    repeat = task.get("repeat", "once")
+    if repeat == "cron":
+        expr = task["cron"]
+        cron = cron_cache.get(expr) if cron_cache is not None else None
+        if cron is None:
+            cron = CronExpression(expr)
+            if cron_cache is not None:
+                cron_cache[expr] = cron
+        candidate = cron.next_after(local_after)
+    else:
+        hour, minute = _parse_hhmm(task["time"])
+        candidate = local_after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= local_after:
+            candidate += timedelta(days=1)
+        if repeat == "weekly":
+            weekdays = set(task.get("weekdays") or range(1, 8))
+            while candidate.isoweekday() not in weekdays:
+                candidate += timedelta(days=1)
+    if candidate is None:
+        return None
+    if tz:
+        candidate = candidate.replace(tzinfo=tz).astimezone().replace(tzinfo=None)
+    return None if is_past_end_date(task, candidate) else candidate
+
+
+def is_past_end_date(task: dict, due: datetime) -> bool:
+    """due（本机时间）是否已超过任务截止日期（含当天）；日期按任务时区判断，未设时区按本机时间"""
+    if not task.get("end_date"):
+        return False
+    if task.get("timezone"):
+        due = due.astimezone(ZoneInfo(task["timezone"]))
+    return due.strftime("%Y-%m-%d") > task["end_date"]
+
+
+def describe_schedule(task: dict) -> str:
+    """任务调度规则的可读描述（用于配置展示）"""
+    repeat = task.get("repeat", "once")
+    if repeat == "cron":
+        text = f"cron（{task['cron']}）"
+    elif repeat == "weekly":
+        days = "、".join(f"周{WEEKDAY_LABELS[d - 1]}" for d in task.get("weekdays", []))
+        text = f"每周{days} {task['time']}"
+    else:
+        text = f"{REPEAT_LABELS.get(repeat, repeat)} {task['time']}"
+    if task.get("end_date"):
+        text += f"，截止{task['end_date']}"
+    if task.get("timezone"):
+        text += f"，时区{task['timezone']}"
+    if task.get("tags"):
+        text += f"，目标标签{task['tags']}"
+    return text
+
+
+# ------------------------------ 定时调度：最小堆+精确睡眠（替代每分钟轮询） ------------------------------
+class TaskScheduler:
+    """
+    最小堆定时调度器：堆顶为最早到期的任务，睡眠到其到期时刻即触发，入堆/出堆均为O(log n)
+    新增任务早于当前堆顶时立即唤醒重新计算睡眠时长；取消/改期的任务在出堆时惰性丢弃
+    """
+
+    MAX_SLEEP_SECONDS = 300  # 单次睡眠上限，防止系统时间被调整后长时间不校准
+
+    def __init__(self):
+        self._heap = []  # (到期时间戳, 序号, task_id)
+        self._due = {}  # task_id -> 当前有效的到期时间戳
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._running = set()  # 正在执行的触发回调（保持引用，防止被垃圾回收）
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, task_id: str, due_ts: float):
+        """登记（或改期）任务的下次执行时间"""
+        self._due[task_id] = due_ts
+        heapq.heappush(self._heap, (due_ts, next(self._seq), task_id))
+        if self._heap[0][2] == task_id:
+            self._wakeup.set()
+
+    def cancel(self, task_id: str):
+        self._due.pop(task_id, None)
+
+    def next_due(self):
+        """返回最早到期的(到期时间戳, task_id)，无任务返回None"""
+        while self._heap:
+            due_ts, _, task_id = self._heap[0]
+            if self._due.get(task_id) == due_ts:
+                return due_ts, task_id
+            heapq.heappop(self._heap)  # 已取消或已改期的旧条目
+        return None
+
+    async def run(self, fire):
+        """调度主循环：到期时以fire(task_id, due_ts)创建独立任务执行，长耗时推送不阻塞后续任务"""
+        while True:
+            self._wakeup.clear()
+            top = self.next_due()
+            delay = self.MAX_SLEEP_SECONDS if top is None else top[0] - time_module.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), min(delay, self.MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due_ts, task_id = top
+            heapq.heappop(self._heap)
+            del self._due[task_id]
+            runner = asyncio.create_task(fire(task_id, due_ts))
+            self._running.add(runner)
+            runner.add_done_callback(self._running.discard)
+
+
+# ------------------------------ 多实例协调：共享SQLite（推送认领+分片扇出+变更版本） ------------------------------
+def shard_of(group_id: str, shard_count: int) -> int:
+    """群所属分片（crc32稳定哈希，各进程计算结果一致）"""
+    return zlib.crc32(group_id.encode("utf-8")) % shard_count
+
+
+class SqliteCoordinator:
+    """
+    多个Bot进程通过同一个本地SQLite文件协调，无需额外服务：
+      workers：实例槽位与心跳，启动时认领最小的空闲槽位（心跳超时视为空闲），槽位号即实例ID
+      push_runs/run_claims：每次推送（定时任务的一次触发或一条即时公告）按当时存活的实例划分分片，
+        分片以(run_key, shard)为主键INSERT OR IGNORE认领，同一分片只会被一个实例发送
+      changes：群列表/定时任务/即时推送的变更日志，自增version即全局顺序，各实例轮询增量应用
+      change_snapshot：已清理的变更折叠成的快照（每个群/任务只保留最终效果的一条事件）及其版本；
+        各实例心跳时上报已应用的版本，所有存活实例都已应用的变更并入快照后从changes删除（低水位清理），
+        新实例或落后于快照的实例先应用快照再追平之后的增量
+    所有SQLite调用在专用单线程执行器中串行执行（单连接），不阻塞事件循环
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS workers (
+            slot INTEGER PRIMARY KEY, heartbeat REAL NOT NULL, started_at REAL NOT NULL,
+            applied_version INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS push_runs (run_key TEXT PRIMARY KEY, workers TEXT NOT NULL, created_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS run_claims (
+            run_key TEXT NOT NULL, shard INTEGER NOT NULL, slot INTEGER NOT NULL, claimed_at REAL NOT NULL,
+            PRIMARY KEY (run_key, shard));
+        CREATE TABLE IF NOT EXISTS changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, worker TEXT NOT NULL,
+            payload TEXT NOT NULL, created_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS change_snapshot (
+            id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL, payload TEXT NOT NULL,
+            created_at REAL NOT NULL);
+    """
+    RUN_RETENTION_SECONDS = 7 * 86400  # 推送认领记录保留时长
+    PRUNE_INTERVAL_SECONDS = 60  # 变更日志低水位清理的最小间隔
+
+    def __init__(self, db_path: str, heartbeat_timeout: float = 30):
+        self.db_path = db_path
+        self.heartbeat_timeout = max(1.0, float(heartbeat_timeout))
+        self.slot = None
+        self.started_at = 0.0  # 与槽位一起标识本实例（槽位被其他实例接管后心跳不会误更新对方）
+        self.worker_id = ""
+        # 进程级实例标识（首次认领的槽位+认领时间）：槽位会被重启的进程复用，变更日志按此区分是否本进程发布
+        self.instance_id = ""
+        self.live_slots = []  # 最近一次心跳时存活的实例槽位
+        self.pruned_version = 0  # 最近一次清理后快照覆盖到的版本
+        self._last_prune = 0.0
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="announcement_push_coord")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _transaction(self, func, *args):
+        """在IMMEDIATE事务中执行func（多进程间互斥写入），异常时回滚"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    def _live_slots_sync(self, now: float) -> list:
+        rows = self._conn.execute(
+            "SELECT slot FROM workers WHERE heartbeat >= ? ORDER BY slot", (now - self.heartbeat_timeout,))
+        return [slot for slot, in rows]
+
+    def _acquire_slot_sync(self, now: float):
+        def _acquire():
+            live = set(self._live_slots_sync(now))
+            slot = next(i for i in itertools.count() if i not in live)
+            self._conn.execute("INSERT OR REPLACE INTO workers (slot, heartbeat, started_at) VALUES (?, ?, ?)",
+                               (slot, now, now))
+            return slot
+
+        self.slot = self._transaction(_acquire)
+        self.started_at = now
+        self.worker_id = f"worker{self.slot}"
+
+    def _start_sync(self, now: float):
+        self._conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        if "applied_version" not in {row[1] for row in self._conn.execute("PRAGMA table_info(workers)")}:
+            # 兼容旧版建表（无已应用版本列）的共享数据库
+            self._conn.execute("ALTER TABLE workers ADD COLUMN applied_version INTEGER NOT NULL DEFAULT 0")
+        self._acquire_slot_sync(now)
+        self.instance_id = f"{self.worker_id}@{self.started_at:.6f}"
+        cutoff = now - self.RUN_RETENTION_SECONDS
+        self._conn.execute("DELETE FROM run_claims WHERE claimed_at < ?", (cutoff,))
+        self._conn.execute("DELETE FROM push_runs WHERE created_at < ?", (cutoff,))
+
+    async def start(self):
+        """连接共享数据库、建表并认领实例槽位"""
+        await self._run(self._start_sync, time_module.time())
+        self.live_slots = [self.slot]
+
+    def _heartbeat_sync(self, applied_version: int, now: float) -> list:
+        updated = self._conn.execute(
+            "UPDATE workers SET heartbeat = ?, applied_version = ? WHERE slot = ? AND started_at = ?",
+            (now, applied_version, self.slot, self.started_at)).rowcount
+        if not updated:
+            # 心跳曾超时且槽位已被其他实例接管：重新认领一个空闲槽位
+            old_worker = self.worker_id
+            self._acquire_slot_sync(now)
+            logger.warning(f"多实例协调：{old_worker}心跳超时后槽位已被接管，本实例改用{self.worker_id}")
+        elif now - self._last_prune >= self.PRUNE_INTERVAL_SECONDS:
+            self._last_prune = now
+            self._transaction(self._prune_changes, now)
+        return self._live_slots_sync(now)
+
+    async def heartbeat(self, applied_version: int = 0) -> list:
+        """刷新本实例心跳并上报已应用的变更版本，返回存活实例槽位；按间隔顺带清理所有存活实例都已应用的变更"""
+        self.live_slots = await self._run(self._heartbeat_sync, applied_version, time_module.time())
+        return self.live_slots
+
+    def _prune_changes(self, now: float):
+        """低水位清理：版本不超过各存活实例已应用版本最小值的变更并入快照，再从changes删除"""
+        low, = self._conn.execute("SELECT MIN(applied_version) FROM workers WHERE heartbeat >= ?",
+                                  (now - self.heartbeat_timeout,)).fetchone()
+        snapshot_version, snapshot = self._snapshot_sync()
+        if not low or low <= snapshot_version:
+            self.pruned_version = snapshot_version
+            return
+        rows = self._conn.execute(
+            "SELECT kind, payload FROM changes WHERE version > ? AND version <= ? ORDER BY version",
+            (snapshot_version, low))
+        for kind, payload in rows:
+            self.fold_change(snapshot, kind, _json_loads(payload))
+        self._conn.execute("INSERT OR REPLACE INTO change_snapshot (id, version, payload, created_at) VALUES (0, ?, ?, ?)",
+                           (low, _json_dumps(snapshot, pretty=False), now))
+        deleted = self._conn.execute("DELETE FROM changes WHERE version <= ?", (low,)).rowcount
+        self.pruned_version = low
+        logger.info(f"多实例协调：清理变更日志{deleted}条（已并入版本{low}的快照）")
+
+    @staticmethod
+    def fold_change(snapshot: dict, kind: str, event: dict):
+        """
+        将一条变更并入快照：每个群只保留一条与依次重放等效的事件（add合并后续refresh，remove覆盖之前的事件），
+        定时任务保留首次upsert（与实例应用任务变更时忽略已有任务一致），remove作为墓碑覆盖upsert（之后的upsert不再生效），
+        即时推送只对当时存活的实例有效，直接丢弃
+        """
+        if kind == "task":
+            task = event.get("task")
+            if event.get("op") == "upsert" and task:
+                snapshot["tasks"].setdefault(task["task_id"], event)
+            elif event.get("op") == "remove":
+                snapshot["tasks"][event["task_id"]] = event
+            return
+        if kind != "group" or event.get("op") not in ("add", "refresh", "remove"):
+            return
+        groups = snapshot["groups"]
+        group_id = event["group"]["group_id"] if event["op"] == "add" else event["group_id"]
+        previous = groups.get(group_id)
+        if event["op"] == "refresh" and previous is not None:
+            if previous["op"] == "add":
+                previous["group"].update(event["fields"])
+            elif previous["op"] == "refresh":
+                previous["fields"].update(event["fields"])
+            return  # 群已移除时refresh不生效
+        groups[group_id] = event
+
+    def _snapshot_sync(self) -> tuple:
+        row = self._conn.execute("SELECT version, payload FROM change_snapshot WHERE id = 0").fetchone()
+        if row is None:
+            return 0, {"groups": {}, "tasks": {}}
+        return row[0], _json_loads(row[1])
+
+    def _publish_sync(self, kind: str, payload: str, now: float) -> int:
+        return self._conn.execute(
+            "INSERT INTO changes (kind, worker, payload, created_at) VALUES (?, ?, ?, ?)",
+            (kind, self.instance_id, payload, now)).lastrowid
+
+    async def publish(self, kind: str, payload: dict) -> int:
+        """写入一条变更（kind：group/task/push），返回其版本号"""
+        return await self._run(self._publish_sync, kind, _json_dumps(payload, pretty=False), time_module.time())
+
+    def _fetch_sync(self, after_version: int, limit: int) -> tuple:
+        def _fetch():
+            snapshot = None
+            snapshot_version, payload = self._snapshot_sync()
+            if after_version < snapshot_version:
+                # 需要的变更已被清理：先返回快照，增量从快照版本之后读取
+                snapshot, after = (snapshot_version, payload), snapshot_version
+            else:
+                after = after_version
+            rows = self._conn.execute(
+                "SELECT version, kind, worker, payload, created_at FROM changes WHERE version > ? ORDER BY version LIMIT ?",
+                (after, limit)).fetchall()
+            return snapshot, [(version, kind, worker, _json_loads(payload), created_at)
+                              for version, kind, worker, payload, created_at in rows]
+
+        self._conn.execute("BEGIN")  # 读事务：快照与增量来自同一时刻，不会被其他实例的清理拆开
+        try:
+            return _fetch()
+        finally:
+            self._conn.execute("COMMIT")
+
+    async def fetch_changes(self, after_version: int, limit: int = 500) -> tuple:
+        """
+        读取版本号大于after_version的变更，返回(snapshot, changes)：
+        snapshot为None或(版本, {"groups": {群ID: 事件}, "tasks": {任务ID: 事件}})（after_version早于已清理的版本时返回），
+        changes为[(version, kind, worker, payload, created_at)]，worker为发布进程的instance_id
+        """
+        return await self._run(self._fetch_sync, after_version, limit)
+
+    def _claim_sync(self, run_key: str, steal: bool, now: float) -> tuple:
+        def _claim():
+            live = self._live_slots_sync(now)
+            if self.slot not in live:
+                live = sorted(live + [self.slot])
+            # 首个到达的实例确定分片方案（当时存活的实例槽位列表），之后的实例沿用
+            self._conn.execute("INSERT OR IGNORE INTO push_runs (run_key, workers, created_at) VALUES (?, ?, ?)",
+                               (run_key, json.dumps(live), now))
+            plan = json.loads(self._conn.execute(
+                "SELECT workers FROM push_runs WHERE run_key = ?", (run_key,)).fetchone()[0])
+            if steal:  # 接管无人认领的分片（负责实例已下线或未及时收到推送）
+                taken = {shard for shard, in self._conn.execute(
+                    "SELECT shard FROM run_claims WHERE run_key = ?", (run_key,))}
+                wanted = [shard for shard in range(len(plan)) if shard not in taken]
+            else:
+                wanted = [shard for shard, slot in enumerate(plan) if slot == self.slot]
+            claimed = [
+                shard for shard in wanted
+                if self._conn.execute(
+                    "INSERT OR IGNORE INTO run_claims (run_key, shard, slot, claimed_at) VALUES (?, ?, ?, ?)",
+                    (run_key, shard, self.slot, now)).rowcount == 1
+            ]
+            return len(plan), claimed
+
+        return self._transaction(_claim)
+
+    async def claim_shards(self, run_key: str, steal: bool = False) -> tuple:
+        """认领一次推送中本实例负责的分片（steal=True时认领所有无人认领的分片），返回(分片数, 认领到的分片列表)"""
+        return await self._run(self._claim_sync, run_key, steal, time_module.time())
+
+    def _close_sync(self):
+        if self._conn is not None:
+            self._conn.execute("UPDATE workers SET heartbeat = 0 WHERE slot = ? AND started_at = ?",
+                               (self.slot, self.started_at))
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        """释放实例槽位（心跳置0，其他实例立即视为下线）并关闭连接"""
+        try:
+            await self._run(self._close_sync)
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+# /pushconfig分页分类的中文别名
+CONFIG_SECTIONS = {"概览": "", "summary": "", "群": "groups", "群列表": "groups", "有效": "valid",
+                   "过期": "expired", "任务": "tasks", "定时任务": "tasks"}
 
 
 # ------------------------------ 插件注册（严格遵循文档位置参数格式） ------------------------------
@@ -45,13 +1655,99 @@ class AnnouncementPushPlugin(Star):
         # 2. 加载WebUI可视化配置（新增@全体权限开关默认值🔶1-369）
         self._load_webui_config()
 
-        # 3. 加载持久化数据（群列表、定时任务🔶1-109）
-        self.group_config = self._load_group_config()
-        self.scheduled_config = self._load_scheduled_config()
+        # 3. 创建持久化存储（数据文件在initialize()中于线程池加载🔶1-109，大文件不阻塞Bot启动）；后续变更经防抖写盘器落盘
+        if self.group_storage_backend == "journal":
+            self.group_store = JournalStore(
+                GROUP_CONFIG_PATH, GROUP_JOURNAL_PATH, "群配置", self._group_config_snapshot,
+                self.save_debounce_seconds, self.journal_compact_threshold)
+        else:
+            self.group_store = DebouncedJsonStore(
+                GROUP_CONFIG_PATH, "群配置", self._group_config_snapshot, self.save_debounce_seconds)
+        self.scheduled_store = DebouncedJsonStore(
+            SCHEDULED_CONFIG_PATH, "定时任务配置", self._scheduled_config_snapshot, self.save_debounce_seconds)
+        # 推送队列：逐群状态变更追加写日志，日志事件数超过队列中群状态条数时才压缩为快照（写盘开销与变更数成正比）
+        self.queue_store = JournalStore(
+            DELIVERY_QUEUE_PATH, DELIVERY_JOURNAL_PATH, "推送队列", lambda: self.delivery_queue.snapshot(),
+            self.save_debounce_seconds,
+            lambda: max(self.journal_compact_threshold, self.delivery_queue.state_count()))
+        # 加载完成前使用空数据（initialize()中整体替换）
+        self.group_config = {k: v for k, v in DEFAULT_GROUP_CONFIG.items() if k != "enabled_groups"}
+        self.groups = GroupRegistry()
+        self.scheduled_config = {**DEFAULT_SCHEDULED_CONFIG, "scheduled_tasks": []}
+        self.delivery_queue = DeliveryQueue({}, self.retry_max_attempts, self.retry_base_seconds)
+        self.startup_load_seconds = None  # 数据加载耗时（/pushconfig展示）
+        self._retry_tasks = {}  # job_id -> 等待重试的后台任务
+        self._inflight = {}  # job_id -> 正在发送的群ID集合（防止并发投递重复发送）
+
+        # 4. 初始化推送限流调度器（全局+按平台令牌桶，限流时自动退避）与@全体能力缓存
+        self.send_scheduler = SendScheduler(
+            self.global_rate_limit,
+            self.platform_rate_limit,
+            self.rate_limit_retcodes,
+            self.rate_limit_max_retries
+        )
+        self.at_all_cache = AtAllCapabilityCache(self.at_all_cache_ttl_hours * 3600, self.at_all_reject_retcodes)
+        self.telemetry = PushTelemetry(self.telemetry_window_minutes)
+        self.passive_refresh_count = 0  # 被动刷新umo的次数（/pushconfig展示）
+
+        # 5. 定时任务调度器（最小堆）；后台任务在initialize()中数据加载完成后创建
+        self.task_scheduler = TaskScheduler()
+        self._cron_cache = {}  # cron表达式 -> 已解析的CronExpression
+        self._listener_task = None
+        self._resume_task = None
+        self._export_task = None
+
+        # 6. 多实例协调（可选）：连接与槽位认领在initialize()中进行
+        self.coordinator = None
+        if self.coordination_mode == "sqlite":
+            self.coordinator = SqliteCoordinator(self.coordination_db_path, self.coordination_heartbeat_timeout)
+        self._coordination_task = None
+        self._coordination_jobs = set()  # 执行其他实例发起的推送、接管分片等后台任务
+        self._publish_jobs = set()  # 待写入共享数据库的变更（停用时等待写完，不取消）
+        self._coordination_version = 0  # 已应用的共享变更日志版本
+
+    async def initialize(self):
+        """
+        异步初始化（AstrBot实例化插件后调用）：在线程池中读取、解析数据文件并构建群索引，不阻塞事件循环
+        加载完成后再启动定时监听、续推与指标导出任务（文档异步任务创建方式🔶1-736、🔶1-738）
+        """
+        start = time_module.perf_counter()
+        if self.coordinator is not None:
+            # 先认领实例槽位：推送队列按槽位分文件（各进程的投递进度互不覆盖，重启后认领同一槽位可续推）
+            await self.coordinator.start()
+            self.queue_store.snapshot_path, self.queue_store.journal_path = self._queue_paths(self.coordinator.worker_id)
+        loop = asyncio.get_running_loop()
+        group_config, groups, scheduled_config, queue_data = await loop.run_in_executor(None, self._load_persistent_data)
+        # queue_data为已重放日志的DeliveryQueue
+        self.group_config = group_config
+        self.groups = groups
+        self.scheduled_config = scheduled_config
+        self.delivery_queue = queue_data
+        self.delivery_queue.listener = self.queue_store.mark_dirty
+        if self.coordinator is not None:
+            # 从本地快照记录的版本起追平共享变更日志（只应用增量，无需整体重新加载）
+            self._coordination_version = int(self.group_config.get("coordination_version", 0))
+            await self._apply_shared_changes()
+        self.startup_load_seconds = time_module.perf_counter() - start
 
-        # 4. 启动定时任务监听（文档异步任务创建方式🔶1-736、🔶1-738）
-        asyncio.create_task(self._scheduled_task_listener())
-        logger.info("公告推送插件初始化完成（仅管理员可用，支持中英文指令+公告换行+平台权限兼容）")
+        # 7. 启动定时任务监听
+        self._listener_task = asyncio.create_task(self._scheduled_task_listener())
+
+        # 8. 续推重启前未完成的推送任务（已送达的群不会重复发送）
+        self._resume_task = asyncio.create_task(self._resume_unfinished_jobs())
+
+        # 9. 按配置定期导出推送指标文件（关闭时不创建任务）
+        if self.telemetry_export_format in METRICS_EXPORT_PATHS:
+            self._export_task = asyncio.create_task(self._telemetry_export_loop())
+
+        # 10. 多实例协调：定期心跳并轮询其他实例的变更
+        if self.coordinator is not None:
+            self._coordination_task = asyncio.create_task(self._coordination_loop())
+            logger.info(f"多实例协调已启用（SQLite：{self.coordination_db_path}），本实例为{self.coordinator.worker_id}")
+        logger.info(
+            f"公告推送插件初始化完成（仅管理员可用，支持中英文指令+公告换行+平台权限兼容），"
+            f"载入{len(self.groups)}个群、{len(self.scheduled_config['scheduled_tasks'])}个定时任务，"
+            f"耗时{self.startup_load_seconds * 1000:.1f}ms（JSON解析：{'orjson' if orjson is not None else 'json'}）")
 
     # ------------------------------ 基础工具方法（新增umo有效性校验） ------------------------------
     def _load_webui_config(self):
@@ -63,18 +1759,74 @@ class AnnouncementPushPlugin(Star):
         self.allow_at_all = self.astr_config.get("allow_at_all", True)  # 仅AIOCQHTTP支持@全体🔶1-98
         self.default_scheduled_time = self.astr_config.get("default_scheduled_time", "09:00")
         self.umo_expire_hours = self.astr_config.get("umo_expire_hours", 24)  # umo过期时间（小时），新增兼容配置
+        # 并发推送上限（同时发送的群数量），设为1即退化为逐群串行推送
+        self.push_concurrency = max(1, int(self.astr_config.get("push_concurrency", 10)))
+        # 推送限流（条/秒，0表示不限速）与限流退避配置
+        self.global_rate_limit = float(self.astr_config.get("global_rate_limit", 20))
+        self.platform_rate_limit = float(self.astr_config.get("platform_rate_limit", 5))
+        self.rate_limit_retcodes = self.astr_config.get("rate_limit_retcodes", [429])
+        self.rate_limit_max_retries = int(self.astr_config.get("rate_limit_max_retries", 3))
+        # 配置写盘防抖间隔（秒）：该时间内的多次修改合并为一次写盘
+        self.save_debounce_seconds = float(self.astr_config.get("save_debounce_seconds", 1.0))
+        # 群配置存储后端：json（每次整文件重写）/ journal（追加写变更日志+定期压缩）
+        self.group_storage_backend = self.astr_config.get("group_storage_backend", "json")
+        self.journal_compact_threshold = int(self.astr_config.get("journal_compact_threshold", 1000))
+        # 停机期间错过的定时任务处理策略：run（补发）/ skip（顺延到下一次该时刻）
+        self.missed_task_policy = self.astr_config.get("missed_task_policy", "run")
+        self.missed_task_grace_minutes = int(self.astr_config.get("missed_task_grace_minutes", 60))
+        # 推送失败自动重试：最多尝试次数与首次重试间隔（秒，之后每次翻倍）
+        self.retry_max_attempts = int(self.astr_config.get("retry_max_attempts", 3))
+        self.retry_base_seconds = float(self.astr_config.get("retry_base_seconds", 30))
+        # @全体成员能力缓存有效期（小时）：过期后重新尝试@全体
+        self.at_all_cache_ttl_hours = float(self.astr_config.get("at_all_cache_ttl_hours", 24))
+        # 带@全体发送失败时，只有这些retcode才视为该群不允许@全体（降级为普通消息）
+        self.at_all_reject_retcodes = self.astr_config.get("at_all_reject_retcodes", [1200])
+        # 被动刷新umo：已开启群内有任意消息时自动更新umo，同一群至少间隔passive_refresh_minutes分钟才写一次
+        self.passive_umo_refresh = bool(self.astr_config.get("passive_umo_refresh", True))
+        self.passive_refresh_seconds = max(0.0, float(self.astr_config.get("passive_refresh_minutes", 10)) * 60)
+        # /pushconfig每页展示的群/任务条数（超长消息会被平台截断或拒绝）
+        self.config_page_size = max(1, int(self.astr_config.get("config_page_size", 20)))
+        # 推送监控：统计窗口（分钟）与指标文件导出（off/json/prometheus，间隔秒）
+        self.telemetry_window_minutes = int(self.astr_config.get("telemetry_window_minutes", 60))
+        self.telemetry_export_format = self.astr_config.get("telemetry_export_format", "off")
+        self.telemetry_export_interval = float(self.astr_config.get("telemetry_export_interval", 60))
+        # 多实例协调：off（单实例）/ sqlite（多个Bot进程共享同一SQLite文件：推送认领去重、群列表同步、分片扇出）
+        self.coordination_mode = self.astr_config.get("coordination_mode", "off")
+        self.coordination_db_path = self.astr_config.get("coordination_db_path", "") or COORDINATION_DB_PATH
+        self.coordination_poll_seconds = max(0.2, float(self.astr_config.get("coordination_poll_seconds", 2)))
+        self.coordination_heartbeat_timeout = float(self.astr_config.get("coordination_heartbeat_timeout", 30))
+        if self.coordination_mode == "sqlite" and self.group_storage_backend == "journal":
+            # 多个进程向同一日志文件追加并各自压缩会互相覆盖，协调模式下群变更已由共享数据库的变更日志记录
+            logger.warning("多实例协调模式下群配置存储后端固定为json（journal后端不支持多进程共享）")
+            self.group_storage_backend = "json"
+
+    def _load_persistent_data(self) -> tuple:
+        """读取并解析全部数据文件、构建群索引（在线程池中执行，此时插件尚未对外提供服务）"""
+        group_config = dict(self._load_group_config())
+        groups = GroupRegistry(group_config.pop("enabled_groups", []))
+        return group_config, groups, self._load_scheduled_config(), self._load_delivery_queue()
 
     def _load_group_config(self) -> dict:
-        """加载已推送群列表（新增umo更新时间字段校验🔶1-109）"""
+        """加载已推送群列表（旧版数据补全umo更新时间等字段，仅迁移一次并写入schema_version🔶1-109）"""
         if os.path.exists(GROUP_CONFIG_PATH):
             try:
-                with open(GROUP_CONFIG_PATH, "r", encoding="utf-8") as f:
-                    raw_config = json.load(f)
-                    # 为旧数据补全umo_update_time字段（兼容历史配置）
-                    for group in raw_config.get("enabled_groups", []):
-                        if "umo_update_time" not in group:
-                            group["umo_update_time"] = group["add_time"]
-                    return raw_config
+                raw_config = _read_json_file(GROUP_CONFIG_PATH)
+                migrated = raw_config.get("schema_version", 1) < DATA_SCHEMA_VERSION
+                if migrated:
+                    migrate_group_config(raw_config)
+                    logger.info(f"群配置已从旧版结构迁移到版本{DATA_SCHEMA_VERSION}")
+                # 重放快照之后的变更日志（日志存储后端，或刚从日志后端切回json时的残留日志）
+                replayed = replay_group_journal(raw_config, GROUP_JOURNAL_PATH)
+                if isinstance(self.group_store, JournalStore):
+                    self.group_store.journal_events = replayed
+                    # 写入迁移后的快照（同时清空已合并的日志）；写入失败时日志保持原样，下次启动仍会重放
+                    if migrated and self._save_group_config(raw_config):
+                        self.group_store.journal_events = 0
+                elif replayed or migrated:
+                    # 写入迁移结果/合并残留日志：快照写入成功后才删除已合并的日志，否则删除日志即丢失这些变更
+                    if self._save_group_config(raw_config) and replayed:
+                        os.remove(GROUP_JOURNAL_PATH)
+                return raw_config
             except Exception as e:
                 logger.error(f"加载群配置失败：{str(e)}，使用默认配置")
                 self._save_group_config(DEFAULT_GROUP_CONFIG)
@@ -83,145 +1835,557 @@ class AnnouncementPushPlugin(Star):
             self._save_group_config(DEFAULT_GROUP_CONFIG)
             return DEFAULT_GROUP_CONFIG
 
-    def _save_group_config(self, config: dict):
-        """保存群列表配置（符合文档“数据修改后需保存”规则🔶1-109）"""
-        try:
-            with open(GROUP_CONFIG_PATH, "w", encoding="utf-8") as f:
-                json.dump(config, f, ensure_ascii=False, indent=4)
-            logger.info("群配置保存成功")
-        except Exception as e:
-            logger.error(f"保存群配置失败：{str(e)}")
+    def _save_group_config(self, config: dict) -> bool:
+        """立即保存群列表配置（同步原子写入，仅用于初始化阶段🔶1-109），返回是否写入成功"""
+        return self.group_store.write_now(config)
+
+    def _group_config_snapshot(self) -> dict:
+        """按原JSON格式导出内存中的群索引与推送状态"""
+        return {"enabled_groups": self.groups.to_list(), **self.group_config}
+
+    def _persist_groups(self, event: dict = None):
+        """
+        登记群配置变更（符合文档“数据修改后需保存”规则🔶1-109），由防抖写盘器合并落盘
+        event为变更事件（add/refresh/remove/meta），日志存储后端据此只追加一行；多实例协调模式下同时发布给其他实例
+        """
+        self.group_store.mark_dirty(event)
+        if self.coordinator is not None and event is not None:
+            self._publish_change("group", event)
 
     def _load_scheduled_config(self) -> dict:
         """加载定时公告任务配置（持久化数据🔶1-109）"""
         if os.path.exists(SCHEDULED_CONFIG_PATH):
             try:
-                with open(SCHEDULED_CONFIG_PATH, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                raw_config = _read_json_file(SCHEDULED_CONFIG_PATH)
+                if raw_config.get("schema_version", 1) < DATA_SCHEMA_VERSION:
+                    self._save_scheduled_config(migrate_scheduled_config(raw_config))
+                    logger.info(f"定时任务配置已从旧版结构迁移到版本{DATA_SCHEMA_VERSION}")
+                return raw_config
             except Exception as e:
                 logger.error(f"加载定时任务配置失败：{str(e)}，使用默认配置")
                 self._save_scheduled_config(DEFAULT_SCHEDULED_CONFIG)
-                return DEFAULT_SCHEDULED_CONFIG
+                return {**DEFAULT_SCHEDULED_CONFIG, "scheduled_tasks": []}
         else:
             self._save_scheduled_config(DEFAULT_SCHEDULED_CONFIG)
-            return DEFAULT_SCHEDULED_CONFIG
+            return {**DEFAULT_SCHEDULED_CONFIG, "scheduled_tasks": []}  # 返回副本，新增任务不会改动默认结构
 
     def _save_scheduled_config(self, config: dict):
-        """保存定时任务配置（符合文档“数据修改后需保存”规则🔶1-109）"""
-        try:
-            with open(SCHEDULED_CONFIG_PATH, "w", encoding="utf-8") as f:
-                json.dump(config, f, ensure_ascii=False, indent=4)
-            logger.info("定时任务配置保存成功")
-        except Exception as e:
-            logger.error(f"保存定时任务配置失败：{str(e)}")
+        """立即保存定时任务配置（同步原子写入，仅用于初始化阶段🔶1-109）"""
+        self.scheduled_store.write_now(config)
+
+    def _scheduled_config_snapshot(self) -> dict:
+        """导出定时任务配置快照（任务逐个复制，写盘线程不与事件循环共享可变对象）"""
+        return {
+            **self.scheduled_config,
+            "scheduled_tasks": [dict(task) for task in self.scheduled_config["scheduled_tasks"]]
+        }
+
+    def _persist_scheduled(self):
+        """登记定时任务配置变更（符合文档“数据修改后需保存”规则🔶1-109），由防抖写盘器合并落盘"""
+        self.scheduled_store.mark_dirty()
+
+    @staticmethod
+    def _queue_paths(worker_id: str) -> tuple:
+        """多进程协同时各实例槽位的推送队列快照与日志路径"""
+        return (os.path.join(PLUGIN_DATA_DIR, f"delivery_queue.{worker_id}.json"),
+                os.path.join(PLUGIN_DATA_DIR, f"delivery_queue.{worker_id}.log"))
+
+    def _load_delivery_queue(self) -> DeliveryQueue:
+        """加载推送队列（记录每个推送任务各群的投递状态）：读取快照后按顺序重放状态变更日志"""
+        data = DEFAULT_DELIVERY_QUEUE
+        if os.path.exists(self.queue_store.snapshot_path):
+            try:
+                data = _read_json_file(self.queue_store.snapshot_path)
+            except Exception as e:
+                logger.error(f"加载推送队列失败：{str(e)}，未完成的推送任务将无法续推")
+        queue = DeliveryQueue(data, self.retry_max_attempts, self.retry_base_seconds)
+        replayed = 0
+        for event in read_journal_events(self.queue_store.journal_path, "推送队列"):
+            try:
+                queue.apply(event)
+            except (KeyError, TypeError, AttributeError):
+                logger.warning(f"推送队列日志中的事件格式错误，已跳过：{str(event)[:100]}")
+                continue
+            replayed += 1
+        self.queue_store.journal_events = replayed
+        return queue
+
+    async def terminate(self):
+        """插件卸载/停用时调用：停止定时监听并立即落盘所有待写变更（日志后端同时压缩为快照）"""
+        for task in (self._listener_task, self._resume_task, self._export_task, self._coordination_task,
+                     *self._retry_tasks.values(), *self._coordination_jobs):
+            if task is not None:  # initialize()未执行时后台任务尚未创建
+                task.cancel()
+        if self._publish_jobs:
+            # 停用前的/pushstop、/schedulepush等变更需发布完成，否则其他实例永远收不到
+            await asyncio.gather(*self._publish_jobs, return_exceptions=True)
+        if isinstance(self.group_store, JournalStore):
+            await self.group_store.flush(compact=True)
+        else:
+            await self.group_store.flush()
+        await self.scheduled_store.flush()
+        await self.queue_store.flush(compact=True)
+        if self.coordinator is not None and self.coordinator.slot is not None:
+            await self.coordinator.close()
+        logger.info("公告推送插件已停止，配置已保存")
 
     # ------------------------------ 新增工具函数：umo有效性校验（基于文档会话标识规则） ------------------------------
-    def _is_umo_valid(self, group: dict) -> bool:
+    def _is_umo_valid(self, group: GroupRecord) -> bool:
         """
-        校验umo是否有效（过期/缺失则无效）
+        校验umo是否有效（过期/缺失则无效），时间戳已在载入时解析，此处仅做数值比较
         符合文档“umo需实时获取”的隐含规则🔶1-252
         """
         # 1. 校验umo是否存在
-        if not group.get("umo"):
-            logger.warning(f"群{group['group_id']}：umo缺失，无效")
+        if not group.umo:
+            logger.warning(f"群{group.group_id}：umo缺失，无效")
             return False
         # 2. 校验umo是否过期（超过设定小时数则无效）
-        try:
-            umo_update_time = datetime.strptime(group["umo_update_time"], "%Y-%m-%d %H:%M:%S")
-            if (datetime.now() - umo_update_time).total_seconds() > self.umo_expire_hours * 3600:
-                logger.warning(f"群{group['group_id']}：umo已过期（{self.umo_expire_hours}小时），需重新开启推送")
-                return False
-            return True
-        except Exception as e:
-            logger.error(f"群{group['group_id']}：umo时间解析失败：{str(e)}，无效")
+        if group.umo_update_ts is None:
+            logger.error(f"群{group.group_id}：umo时间解析失败（{group.umo_update_time}），无效")
             return False
+        if time_module.time() - group.umo_update_ts > self.umo_expire_hours * 3600:
+            logger.warning(f"群{group.group_id}：umo已过期（{self.umo_expire_hours}小时），需重新开启推送")
+            return False
+        return True
 
-    # ------------------------------ 定时任务核心逻辑（新增umo校验） ------------------------------
-    async def _scheduled_task_listener(self):
-        """监听定时公告任务，到点执行推送（新增umo有效性校验🔶1-252）"""
-        while True:
-            now = datetime.now()
-            current_time = now.strftime("%H:%M")
-
-            # 遍历所有定时任务（切片防遍历中修改列表）
-            for task in self.scheduled_config["scheduled_tasks"][:]:
-                if task["time"] == current_time:
-                    # 执行推送（传递含\n的原始内容，新增umo校验）
-                    push_result = await self._send_announcement_to_groups(task["content"])
-                    logger.info(f"定时公告（ID：{task['task_id']}）执行完成：{push_result}")
-
-                    # 更新状态并删除已执行任务
-                    self.scheduled_config["last_scheduled_push_time"] = now.strftime("%Y-%m-%d %H:%M:%S")
-                    self.scheduled_config["scheduled_tasks"] = [
-                        t for t in self.scheduled_config["scheduled_tasks"] if t["task_id"] != task["task_id"]
-                    ]
-                    self._save_scheduled_config(self.scheduled_config)
-
-            # 每分钟检查一次（降低资源占用）
-            await asyncio.sleep(60)
-
-    # ------------------------------ 核心修复：推送方法优化（平台权限兼容） ------------------------------
-    async def _send_announcement_to_groups(self, content: str) -> str:
-        """向所有已开启群推送公告（核心修复：umo校验+@全体权限兼容🔶1-98、🔶1-252）"""
-        if not self.group_config["enabled_groups"]:
-            return "无已开启推送的群"
+    # ------------------------------ 定时任务核心逻辑（最小堆调度，到点精确触发） ------------------------------
+    def _get_task(self, task_id: str):
+        for task in self.scheduled_config["scheduled_tasks"]:
+            if task["task_id"] == task_id:
+                return task
+        return None
 
-        success_cnt = 0
-        fail_cnt = 0
-        fail_groups = []
-        push_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _schedule_task(self, task: dict, now: datetime) -> bool:
+        """
+        将任务登记到调度器并记录next_run；返回任务是否有变化（需要写盘）
+        旧任务无next_run时按创建时间推算；已错过的任务按missed_task_policy补发或顺延
+        next_run只在创建、执行后或错过时计算一次并持久化，调度器不会反复求值规则
+        补发时立即触发，但next_run保留错过的原定时间：各实例据此生成相同的run_key，补发不会重复推送
+        """
+        next_run = task.get("next_run")
+        due = datetime.strptime(next_run, TIME_FORMAT) if next_run else None
+        if due is None:
+            created = datetime.strptime(task.get("create_time") or now.strftime(TIME_FORMAT), TIME_FORMAT)
+            due = compute_next_run(task, created, self._cron_cache)
+        if due is not None and is_past_end_date(task, due):
+            due = None
+        fire_at = due  # 实际触发时间（补发时为当前时间，due仍为原定时间）
+        if due is not None and due <= now:
+            missed_minutes = (now - due).total_seconds() / 60
+            within_grace = not self.missed_task_grace_minutes or missed_minutes <= self.missed_task_grace_minutes
+            if self.missed_task_policy == "run" and within_grace:
+                logger.warning(f"定时公告（ID：{task['task_id']}）在停机期间错过（{due.strftime(TIME_FORMAT)}），立即补发")
+                fire_at = now
+            else:
+                logger.warning(f"定时公告（ID：{task['task_id']}）在停机期间错过（{due.strftime(TIME_FORMAT)}），顺延到下一次")
+                due = fire_at = compute_next_run(task, now, self._cron_cache)
+        if due is None:
+            # 已超过截止日期：无需再执行，直接移除
+            logger.info(f"定时公告（ID：{task['task_id']}）已过截止日期，自动移除")
+            self.task_scheduler.cancel(task["task_id"])
+            self._remove_task(task["task_id"])
+            return True
+        self.task_scheduler.schedule(task["task_id"], fire_at.timestamp())
+        due_text = due.strftime(TIME_FORMAT)
+        changed = task.get("next_run") != due_text
+        task["next_run"] = due_text
+        return changed
 
-        for group in self.group_config["enabled_groups"]:
-            group_id = group["group_id"]
+    async def _scheduled_task_listener(self):
+        """载入所有定时任务并运行最小堆调度器，到点执行推送（新增umo有效性校验🔶1-252）"""
+        now = datetime.now()
+        changed = False
+        for task in list(self.scheduled_config["scheduled_tasks"]):
             try:
-                # 1. 先校验umo有效性，无效则跳过并提示
-                if not self._is_umo_valid(group):
-                    fail_cnt += 1
-                    fail_groups.append(group_id)
-                    continue
-
-                # 2. 构建消息链（新增@全体权限兼容：失败则降级为无@消息🔶1-98）
-                message_chain = MessageChain()
-                at_added = False
-                if self.allow_at_all:
-                    try:
-                        # 尝试添加@全体成员（仅AIOCQHTTP支持，失败则捕获异常）
-                        message_chain.chain.append(Comp.At(qq="all"))
-                        at_added = True
-                    except Exception as e:
-                        logger.warning(f"群{group_id}：添加@全体成员失败（无权限/平台限制）：{str(e)}，降级为普通消息")
-
-                # 3. 添加公告内容（保留\n换行，符合Comp.Plain规则🔶1-259）
-                if at_added:
-                    message_chain.chain.append(Comp.Plain(f"\n【管理员公告】\n{content}\n\n推送时间：{push_time}"))
-                else:
-                    message_chain.chain.append(Comp.Plain(f"【管理员公告】\n{content}\n\n推送时间：{push_time}"))
+                changed = self._schedule_task(task, now) or changed
+            except Exception as e:
+                logger.error(f"定时公告（ID：{task.get('task_id')}）时间解析失败：{str(e)}，已忽略")
+        if changed:
+            self._persist_scheduled()
+        await self.task_scheduler.run(self._fire_scheduled_task)
 
-                # 4. 发送主动消息（符合文档位置参数规则🔶1-250，新增详细日志）
-                logger.debug(f"群{group_id}：使用umo={group['umo']}发送消息")
-                await self.context.send_message(
-                    group["umo"],  # 会话唯一标识（已校验有效性）
-                    message_chain  # 含换行/兼容@的消息链
-                )
-                success_cnt += 1
-                logger.info(f"群{group_id}：推送成功")
+    def _remove_task(self, task_id: str, publish: bool = True):
+        """移除任务（已执行的一次性任务、已过截止日期的任务）；多实例协调时同时发布移除变更，其他实例不会再恢复该任务"""
+        tasks = self.scheduled_config["scheduled_tasks"]
+        self.scheduled_config["scheduled_tasks"] = [t for t in tasks if t["task_id"] != task_id]
+        if publish and self.coordinator is not None and len(self.scheduled_config["scheduled_tasks"]) < len(tasks):
+            self._publish_change("task", {"op": "remove", "task_id": task_id})
 
+    async def _fire_scheduled_task(self, task_id: str, due_ts: float):
+        """调度器到点回调：执行推送；一次性任务删除，重复任务从本次时间增量计算下次执行时间"""
+        task = self._get_task(task_id)
+        if task is None:
+            return
+        # 本次的原定执行时间（补发时due_ts为补发时刻，各实例不同；原定时间各实例一致，用于生成run_key）
+        scheduled_text = task.get("next_run") or datetime.fromtimestamp(due_ts).strftime(TIME_FORMAT)
+        # 先登记下次执行（推送耗时较长时不影响下次准点触发）
+        if task.get("repeat", "once") == "once":
+            self._remove_task(task_id)
+        else:
+            try:
+                next_due = compute_next_run(task, datetime.fromtimestamp(due_ts), self._cron_cache)
             except Exception as e:
-                # 捕获平台接口错误，新增详细错误日志（方便定位retcode问题）
-                fail_cnt += 1
-                fail_groups.append(group_id)
-                err_detail = f"retcode={e.retcode if hasattr(e, 'retcode') else '未知'}, message={str(e)}"
-                logger.error(f"群{group_id}：推送失败（{err_detail}），需重新执行/pushstart更新umo")
+                logger.error(f"定时公告（ID：{task_id}）规则解析失败：{str(e)}，本次执行后移除")
+                next_due = None
+            if next_due is None:
+                logger.info(f"定时公告（ID：{task_id}）已无后续执行时间，本次执行后移除")
+                self._remove_task(task_id)
+            else:
+                task["next_run"] = next_due.strftime(TIME_FORMAT)
+                self._schedule_task(task, datetime.now())  # 推送积压导致已错过时按补发策略处理
+        self._persist_scheduled()
+
+        # 执行推送（传递含\n的原始内容，新增umo校验）
+        # 多实例协调时各实例以相同的run_key认领分片，同一次触发只会被发送一次
+        push_result = await self._send_announcement_to_groups(
+            task["content"], source=task_id, tags=task.get("tags", ""), run_key=f"{task_id}@{scheduled_text}")
+        logger.info(f"定时公告（ID：{task_id}）执行完成：{push_result}")
+
+        # 更新状态
+        self.scheduled_config["last_scheduled_push_time"] = datetime.now().strftime(TIME_FORMAT)
+        self._persist_scheduled()
+
+    # ------------------------------ 核心修复：推送方法优化（平台权限兼容+并发扇出） ------------------------------
+    async def _send_announcement_to_groups(self, content: str, source: str = "manual", tags: str = "",
+                                           run_key: str = "", claimed: tuple = None) -> str:
+        """
+        向已开启群推送公告（并发扇出：按push_concurrency限制同时发送的群数量🔶1-98、🔶1-252）
+        tags为标签表达式时只推送匹配的群（由标签倒排索引解析），为空时推送全部群
+        每次推送登记为持久化推送任务，逐群记录投递状态，重启后可续推、失败群可单独重试
+        多实例协调模式下按run_key认领分片，只发送本实例认领到的分片（claimed为接管流程已认领的(分片数, 分片列表)）
+        """
+        if not self.groups:
+            return "无已开启推送的群"
+
+        # 快照群列表：推送过程中/pushstart、/pushstop修改列表不影响本次推送
+        if tags:
+            try:
+                group_ids = self.groups.resolve_tags(tags)
+            except ValueError as e:
+                return f"标签表达式错误：{str(e)}"
+            if not group_ids:
+                return f"标签表达式“{tags}”没有匹配的群（/pushconfig可查看各标签的群数量）"
+        else:
+            group_ids = [g.group_id for g in self.groups]
+
+        shard_note = ""
+        if self.coordinator is not None:
+            if not run_key:  # 本实例收到的即时公告：广播给其他实例，共同分片发送
+                run_key = f"push_{self.coordinator.worker_id}_{time_module.time() * 1000:.0f}"
+                self._publish_change("push", {"run_key": run_key, "content": content, "source": source, "tags": tags})
+            if claimed is None:
+                shard_count, shards = await self.coordinator.claim_shards(run_key)
+                self._spawn_coordination_job(self._steal_unclaimed_shards(content, source, tags, run_key))
+            else:
+                shard_count, shards = claimed
+            if not shards:
+                return f"本次推送的{shard_count}个分片均由其他实例负责发送"
+            shard_set = set(shards)
+            group_ids = [gid for gid in group_ids if shard_of(gid, shard_count) in shard_set]
+            shard_note = f"（多实例分片：本实例{self.coordinator.worker_id}负责{len(shards)}/{shard_count}个分片）\n"
+            if not group_ids:
+                return shard_note + "本实例负责的分片中没有目标群"
+
+        push_time = datetime.now().strftime(TIME_FORMAT)
+        job = self.delivery_queue.create_job(content, source, push_time, group_ids, tags)
+        return shard_note + await self._deliver_job(job, ("pending",))
+
+    async def _deliver_job(self, job: dict, states) -> str:
+        """投递推送任务中处于states状态的群，返回本轮推送结果摘要；可重试的失败群交由后台按退避时间重试"""
+        queue = self.delivery_queue
+        inflight = self._inflight.setdefault(job["job_id"], set())
+        target_ids = [gid for gid in queue.targets(job, states, time_module.time()) if gid not in inflight]
+        inflight.update(target_ids)
+
+        # 逐个目标群按umo更新时间判断有效性（只检查本次目标，分组推送无需遍历全部群），无效群直接判定失败（umo不会自行恢复，无需重试）
+        expire_seconds, now_ts = self.umo_expire_hours * 3600, time_module.time()
+        sendable = []
+        skipped_groups = []
+        for gid in target_ids:
+            group = self.groups.get(gid)
+            if group is None or not self.groups.is_valid(gid, expire_seconds, now_ts):
+                if group is not None:
+                    self._is_umo_valid(group)  # 记录无效原因（缺失/过期/时间解析失败）
+                queue.mark(job, gid, "群已移除" if group is None else "umo无效", retryable=False)
+                skipped_groups.append(gid)
+                inflight.discard(gid)
+            else:
+                sendable.append(group)
+        results = [None] * len(sendable)
+        pending = iter(enumerate(sendable))
+        # 公告只编译一次，各群共享消息链（含逐群占位符时仅替换差异部分）
+        template = AnnouncementTemplate(job["content"], job["push_time"], self.allow_at_all)
+
+        async def _worker():
+            # 工作协程共享同一迭代器，单线程事件循环内next()无竞争
+            for index, group in pending:
+                error = await self._send_to_group(group, template, index + 1)
+                results[index] = queue.mark(job, group.group_id, error)
+                inflight.discard(group.group_id)
+
+        worker_cnt = max(1, min(self.push_concurrency, len(sendable)))
+        fanout_start = time_module.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(worker_cnt)))
+        if not inflight:  # 该任务已没有正在发送的群（无并发投递），移除条目，避免字典随推送次数无限增长
+            self._inflight.pop(job["job_id"], None)
+        if sendable:
+            self.telemetry.record_fanout(time_module.perf_counter() - fanout_start, len(sendable))
+
+        queue.refresh_status(job)
+        if queue.next_retry_at(job) is not None:
+            self._ensure_retry(job)
+
+        success_cnt = results.count("sent")
+        retry_cnt = results.count("retrying")
+        fail_groups = skipped_groups + [g.group_id for g, state in zip(sendable, results) if state == "failed"]
+        fail_cnt = len(fail_groups)
 
         # 构建结果信息，提示umo过期/权限问题的解决方案
-        result_msg = f"成功{success_cnt}个群，失败{fail_cnt}个群\n"
+        result_msg = f"成功{success_cnt}个群，失败{fail_cnt}个群"
+        result_msg += f"（另有{retry_cnt}个群等待自动重试）\n" if retry_cnt else "\n"
         if fail_groups:
             result_msg += f"失败群ID：{','.join(fail_groups)}\n"
-            result_msg += "失败原因：可能是umo过期（需重新发送/pushstart）或@全体权限不足（关闭WebUI的@全体开关）"
+            result_msg += "失败原因：可能是umo过期（需重新发送/pushstart）或平台接口异常（@全体被拒绝时已自动改发普通消息）\n"
         else:
-            result_msg += "失败群ID：无"
+            result_msg += "失败群ID：无\n"
+        result_msg += f"推送任务ID：{job['job_id']}（/pushjobs查看进度，/pushretry重试失败群）"
         return result_msg
 
+    def _ensure_retry(self, job: dict):
+        """为推送任务启动后台重试（每个任务最多一个重试协程）"""
+        if job["job_id"] not in self._retry_tasks:
+            self._retry_tasks[job["job_id"]] = asyncio.create_task(self._retry_job(job))
+
+    async def _retry_job(self, job: dict):
+        """按退避时间依次重试任务中retrying状态的群，直到全部送达或判定失败"""
+        try:
+            while (retry_at := self.delivery_queue.next_retry_at(job)) is not None:
+                await asyncio.sleep(max(0.0, retry_at - time_module.time()))
+                result = await self._deliver_job(job, ("retrying",))
+                logger.info(f"推送任务{job['job_id']}自动重试完成：{result}")
+        finally:
+            self._retry_tasks.pop(job["job_id"], None)
+
+    async def _resume_unfinished_jobs(self, jobs: list = None):
+        """插件启动后续推未完成的推送任务（jobs为空时取队列中全部未完成任务）：待发送的群立即发送，重试中的群按原退避时间重试"""
+        for job in jobs if jobs is not None else self.delivery_queue.unfinished_jobs():
+            logger.info(f"续推重启前未完成的推送任务{job['job_id']}：{self.delivery_queue.progress(job)}")
+            result = await self._deliver_job(job, ("pending",))
+            logger.info(f"推送任务{job['job_id']}续推完成：{result}")
+
+    async def _send_to_group(self, group: GroupRecord, template: AnnouncementTemplate, counter: int):
+        """向单个群推送公告（umo已校验有效），成功返回None，失败返回错误描述（异常在此处消化，不影响其他群的并发发送）"""
+        group_id = group.group_id
+        platform = SendScheduler.platform_of(group.umo)
+        try:
+            # 1. 按能力缓存选择消息链变体：已知不支持@全体的群直接用无@变体🔶1-98（保留\n换行🔶1-259）
+            use_at = self.allow_at_all and template.has_at_variant and self.at_all_cache.should_try(platform, group_id)
+
+            # 2. 发送主动消息（符合文档位置参数规则🔶1-250，新增详细日志）
+            logger.debug(f"群{group_id}：使用umo={group.umo}发送消息")
+            try:
+                await self._send_chain(group, platform, template.chain_for(group_id, counter, with_at=use_at))
+            except Exception as e:
+                if not use_at or not self.at_all_cache.is_rejection(e):
+                    raise  # 超时、限流等与@全体无关（或无法确定首次是否已送达）的错误走普通重试，避免误判与重复发送
+                # 平台拒绝@全体：立即用无@变体重试一次，成功则记录该群不支持@全体
+                logger.warning(f"群{group_id}：@全体成员发送失败（{str(e)}），改为普通消息重试")
+                try:
+                    await self._send_chain(group, platform, template.chain_for(group_id, counter, with_at=False))
+                except Exception:
+                    self.at_all_cache.forget(platform, group_id)  # 无@也失败，说明与@全体无关
+                    raise
+                self.at_all_cache.record(platform, group_id, False)
+                logger.info(f"群{group_id}：推送成功（已降级为无@全体消息）")
+                return None
+            if use_at:
+                self.at_all_cache.record(platform, group_id, True)
+            logger.info(f"群{group_id}：推送成功")
+            return None
+
+        except Exception as e:
+            # 捕获平台接口错误，新增详细错误日志（方便定位retcode问题）
+            err_detail = f"retcode={e.retcode if hasattr(e, 'retcode') else '未知'}, message={str(e)}"
+            if self.send_scheduler.is_rate_limited(e):
+                logger.error(f"群{group_id}：推送失败（{err_detail}），多次重试仍被平台限流，请调低WebUI中的推送速率")
+            else:
+                logger.error(f"群{group_id}：推送失败（{err_detail}），需重新执行/pushstart更新umo")
+            return err_detail
+
+    async def _send_chain(self, group: GroupRecord, platform: str, message_chain: MessageChain):
+        """经限流调度器发送一条消息链（仅统计平台接口调用耗时，不含限流等待）"""
+
+        async def _timed_send():
+            start = time_module.perf_counter()
+            try:
+                result = await self.context.send_message(
+                    group.umo,  # 会话唯一标识（已校验有效性）
+                    message_chain  # 含换行/兼容@的消息链
+                )
+            except Exception as e:
+                self.telemetry.record_send(platform, time_module.perf_counter() - start,
+                                           getattr(e, "retcode", None), failed=True)
+                raise
+            self.telemetry.record_send(platform, time_module.perf_counter() - start)
+            return result
+
+        await self.send_scheduler.send(platform, _timed_send)  # 按平台限流
+
+    # ------------------------------ 多实例协调：变更发布/应用与分片接管 ------------------------------
+    def _spawn_coordination_job(self, coro):
+        """创建协调相关的后台任务（持有引用防止被回收，完成后自动移除，停用时统一取消）"""
+        job = asyncio.create_task(coro)
+        self._coordination_jobs.add(job)
+        job.add_done_callback(self._coordination_jobs.discard)
+        return job
+
+    def _publish_change(self, kind: str, payload: dict):
+        """异步发布一条共享变更（单线程执行器保证按调用顺序写入）"""
+        async def _publish():
+            try:
+                await self.coordinator.publish(kind, payload)
+            except Exception as e:
+                logger.error(f"多实例协调：发布{kind}变更失败：{str(e)}")
+
+        job = asyncio.create_task(_publish())
+        self._publish_jobs.add(job)
+        job.add_done_callback(self._publish_jobs.discard)
+
+    async def _coordination_loop(self):
+        """定期刷新心跳并应用其他实例发布的变更"""
+        while True:
+            try:
+                worker_id = self.coordinator.worker_id
+                await self.coordinator.heartbeat(self._coordination_version)
+                if self.coordinator.worker_id != worker_id:
+                    await self._move_delivery_queue(worker_id)
+                await self._apply_shared_changes()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"多实例协调：同步失败：{str(e)}")
+            await asyncio.sleep(self.coordination_poll_seconds)
+
+    async def _move_delivery_queue(self, old_worker: str):
+        """
+        槽位被接管后改用新槽位：旧槽位的队列文件已归接管的实例所有，本实例不再写入
+        推送队列改写到新槽位的文件（合并该槽位上一任实例遗留的任务并续推），内存中的投递进度完整写入新快照
+        """
+        logger.error(f"多实例协调：{old_worker}的槽位已被其他实例接管，推送队列改存到{self.coordinator.worker_id}的文件"
+                     f"（请检查本进程是否长时间阻塞，或适当调大coordination_heartbeat_timeout）")
+        self.queue_store.snapshot_path, self.queue_store.journal_path = self._queue_paths(self.coordinator.worker_id)
+        loop = asyncio.get_running_loop()
+        adopted = []
+        for job_id, job in (await loop.run_in_executor(None, self._load_delivery_queue)).jobs.items():
+            if job_id not in self.delivery_queue.jobs:
+                self.delivery_queue.jobs[job_id] = job
+                adopted.append(job)
+        self.queue_store.mark_dirty()
+        await self.queue_store.flush(compact=True)
+        if unfinished := [job for job in adopted if job["status"] != "done"]:
+            self._spawn_coordination_job(self._resume_unfinished_jobs(unfinished))
+
+    async def _apply_shared_changes(self):
+        """
+        按版本顺序应用共享变更日志中的增量（群变更包含本实例自己发布的，保证各实例应用顺序一致）
+        本地版本早于已清理的版本时（新实例或长时间离线）先应用折叠快照再追平增量
+        """
+        while True:
+            snapshot, changes = await self.coordinator.fetch_changes(self._coordination_version)
+            if snapshot is None and not changes:
+                break
+            if snapshot is not None:
+                version, payload = snapshot
+                logger.info(f"多实例协调：本地版本{self._coordination_version}早于已清理的变更，应用版本{version}的快照")
+                for event in payload["groups"].values():
+                    self._apply_group_change(event)
+                for event in payload["tasks"].values():
+                    self._apply_task_change(event)
+                self._coordination_version = version
+            for version, kind, worker, payload, created_at in changes:
+                own = worker == self.coordinator.instance_id
+                if kind == "group":
+                    self._apply_group_change(payload)
+                elif kind == "task" and not own:
+                    self._apply_task_change(payload)
+                elif kind == "push" and not own and time_module.time() - created_at <= self.coordination_heartbeat_timeout:
+                    # 其他实例发起的即时公告：参与分片发送（过旧的推送由发起实例的接管流程兜底）
+                    self._spawn_coordination_job(self._run_shared_push(payload))
+                self._coordination_version = version
+            self.group_config["coordination_version"] = self._coordination_version
+            self.group_store.mark_dirty({"op": "meta", "data": {"coordination_version": self._coordination_version}})
+
+    def _apply_group_change(self, event: dict):
+        """应用一条群变更事件（与日志后端的事件格式相同，重复应用结果不变），只写本地文件不再发布"""
+        op = event.get("op")
+        if op == "add":
+            self.groups.upsert(GroupRecord.from_dict(event["group"]))
+        elif op == "refresh":
+            fields = event["fields"]
+            if "umo" in fields:
+                self.groups.refresh_umo(event["group_id"], fields["umo"], fields["umo_update_time"])
+            if "tags" in fields:
+                self.groups.set_tags(event["group_id"], fields["tags"])
+        elif op == "remove":
+            self.groups.remove(event["group_id"])
+        elif op == "meta":
+            self.group_config.update(event["data"])
+        self.group_store.mark_dirty(event)
+
+    def _apply_task_change(self, event: dict):
+        """
+        应用其他实例的定时任务变更：upsert加入本地任务列表并调度（到点时各实例按run_key认领，不会重复推送），
+        remove移除任务；原定时间已过的一次性任务说明已由其他实例执行，直接忽略（不按错过策略顺延）
+        """
+        if event.get("op") == "remove":
+            if self._get_task(event["task_id"]) is not None:
+                self.task_scheduler.cancel(event["task_id"])
+                self._remove_task(event["task_id"], publish=False)
+                self._persist_scheduled()
+                logger.info(f"多实例协调：同步移除定时公告（ID：{event['task_id']}）")
+            return
+        task = event.get("task")
+        if event.get("op") != "upsert" or not task or self._get_task(task["task_id"]) is not None:
+            return
+        if task.get("repeat", "once") == "once" and task.get("next_run") and \
+                datetime.strptime(task["next_run"], TIME_FORMAT) <= datetime.now():
+            logger.info(f"多实例协调：一次性定时公告（ID：{task['task_id']}）原定时间已过，不再同步")
+            return
+        self.scheduled_config["scheduled_tasks"].append(task)
+        self._schedule_task(task, datetime.now())
+        self._persist_scheduled()
+        logger.info(f"多实例协调：同步定时公告（ID：{task['task_id']}）")
+
+    async def _run_shared_push(self, payload: dict):
+        result = await self._send_announcement_to_groups(
+            payload["content"], source=payload.get("source", "manual"), tags=payload.get("tags", ""),
+            run_key=payload["run_key"])
+        logger.info(f"多实例协调：参与推送{payload['run_key']}完成：{result}")
+
+    async def _steal_unclaimed_shards(self, content: str, source: str, tags: str, run_key: str):
+        """心跳超时时长后检查该次推送是否仍有无人认领的分片（负责实例已下线），有则由本实例接管发送"""
+        await asyncio.sleep(self.coordination_heartbeat_timeout)
+        shard_count, shards = await self.coordinator.claim_shards(run_key, steal=True)
+        if shards:
+            logger.warning(f"多实例协调：推送{run_key}有{len(shards)}个分片无人认领，由本实例接管")
+            result = await self._send_announcement_to_groups(
+                content, source, tags, run_key=run_key, claimed=(shard_count, shards))
+            logger.info(f"多实例协调：接管推送{run_key}完成：{result}")
+
+    async def _telemetry_export_loop(self):
+        """按间隔将推送指标写入数据目录（原子替换，外部采集程序不会读到半个文件）"""
+        path = METRICS_EXPORT_PATHS[self.telemetry_export_format]
+        while True:
+            await asyncio.sleep(max(1.0, self.telemetry_export_interval))
+            try:
+                if self.telemetry_export_format == "prometheus":
+                    text = self.telemetry.to_prometheus()
+                else:
+                    text = _json_dumps(self.telemetry.to_dict())
+                await asyncio.get_running_loop().run_in_executor(None, _write_text_atomic, path, text)
+            except Exception as e:
+                logger.error(f"导出推送指标失败：{str(e)}")
+
     # ------------------------------ 推送开启指令：新增umo更新时间（关键修复） ------------------------------
     @filter.command(
         "pushstart",
@@ -230,37 +2394,96 @@ class AnnouncementPushPlugin(Star):
     )
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)  # 仅群聊触发🔶1-178
-    async def cmd_push_start(self, event: AstrMessageEvent, *args):
-        """推送开启：实时更新umo与更新时间（解决umo过期问题🔶1-252）"""
+    async def cmd_push_start(self, event: AstrMessageEvent, tags: str = ""):
+        """推送开启：实时更新umo与更新时间（解决umo过期问题🔶1-252），可选同时设置群标签"""
         group_id = event.get_group_id() or event.message_obj.group_id  # 获取群ID🔶1-69、🔶1-78
         umo = event.unified_msg_origin  # 实时获取umo（文档要求：群消息事件中获取🔶1-252）
         if not group_id or not umo:
             yield event.plain_result("获取群ID或会话标识（umo）失败，无法开启推送")
             return
+        try:
+            tag_list = normalize_tags(tags)
+        except ValueError as e:
+            yield event.plain_result(f"{str(e)}\n例：/pushstart vip,新手群")
+            return
 
-        # 检查群是否已在列表，若存在则更新umo与时间
-        for group in self.group_config["enabled_groups"]:
-            if group["group_id"] == group_id:
-                group["umo"] = umo  # 更新为实时umo
-                group["umo_update_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self._save_group_config(self.group_config)
-                yield event.plain_result(f"群{group_id}已更新会话标识（umo），推送功能保持开启")
-                return
+        # 检查群是否已在列表（字典索引O(1)），若存在则更新umo与时间
+        now_text = datetime.now().strftime(TIME_FORMAT)
+        if self.groups.refresh_umo(group_id, umo, now_text) is not None:  # 更新为实时umo
+            fields = {"umo": umo, "umo_update_time": now_text}
+            if tag_list:  # 未指定标签时保留原有标签
+                self.groups.set_tags(group_id, tag_list)
+                fields["tags"] = tag_list
+            self._persist_groups({"op": "refresh", "group_id": group_id, "fields": fields})
+            tag_text = f"，标签：{'、'.join(tag_list)}" if tag_list else ""
+            yield event.plain_result(f"群{group_id}已更新会话标识（umo）{tag_text}，推送功能保持开启")
+            return
 
         # 新群添加：包含umo更新时间
-        new_group = {
-            "group_id": group_id,
-            "umo": umo,
-            "add_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "umo_update_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # 新增umo更新时间
-        }
-        self.group_config["enabled_groups"].append(new_group)
-        self._save_group_config(self.group_config)
+        new_group = GroupRecord(group_id, umo, now_text, now_text, tags=tag_list)
+        self.groups.upsert(new_group)
+        self._persist_groups({"op": "add", "group": new_group.to_dict()})
         yield event.plain_result(
-            f"群{group_id}已添加到推送列表！当前列表共{len(self.group_config['enabled_groups'])}个群\n"
-            f"提示：若后续推送失败，需重新发送/pushstart更新会话标识（umo）"
+            f"群{group_id}已添加到推送列表！当前列表共{len(self.groups)}个群\n"
+            + (f"群标签：{'、'.join(tag_list)}\n" if tag_list else "")
+            + f"提示：若后续推送失败，需重新发送/pushstart更新会话标识（umo）"
         )
 
+    @filter.command(
+        "pushtag",
+        alias={"推送标签"},
+        priority=0
+    )
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    async def cmd_push_tag(self, event: AstrMessageEvent, tags: str = ""):
+        """推送标签：查看/设置当前群的标签（逗号分隔，整体替换；“清空”移除全部标签）"""
+        group_id = event.get_group_id() or event.message_obj.group_id
+        group = self.groups.get(group_id) if group_id else None
+        if group is None:
+            yield event.plain_result(f"群{group_id}不在推送列表中，请先发送/pushstart开启推送")
+            return
+        if not tags.strip():
+            yield event.plain_result(
+                f"群{group_id}当前标签：{'、'.join(group.tags) or '无'}\n"
+                f"设置：/pushtag vip,新手群（整体替换），清空：/pushtag 清空")
+            return
+
+        try:
+            tag_list = [] if tags.strip() in ("清空", "clear") else normalize_tags(tags)
+        except ValueError as e:
+            yield event.plain_result(str(e))
+            return
+        self.groups.set_tags(group_id, tag_list)
+        self._persist_groups({"op": "refresh", "group_id": group_id, "fields": {"tags": tag_list}})
+        yield event.plain_result(f"群{group_id}标签已更新为：{'、'.join(tag_list) or '无'}")
+
+    # ------------------------------ 被动刷新umo：群消息监听（不回复、不拦截事件） ------------------------------
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    async def on_group_message(self, event: AstrMessageEvent):
+        """
+        已开启推送的群收到任意消息时刷新umo与更新时间，无需管理员逐群/pushstart
+        热路径仅一次字典查找：未开启推送的群、距上次刷新不足间隔且umo未变化的群直接返回
+        写盘交给防抖存储合并（日志后端为追加一行refresh事件），高频群不会每条消息落盘一次
+        """
+        if not self.passive_umo_refresh:
+            return
+        group = self.groups.get(event.get_group_id())
+        if group is None:
+            return
+        umo = event.unified_msg_origin
+        now_ts = time_module.time()
+        if not umo or (umo == group.umo and group.umo_update_ts is not None
+                       and now_ts - group.umo_update_ts < self.passive_refresh_seconds):
+            return
+
+        now_text = datetime.fromtimestamp(now_ts).strftime(TIME_FORMAT)
+        self.groups.refresh_umo(group.group_id, umo, now_text)
+        self._persist_groups({"op": "refresh", "group_id": group.group_id,
+                              "fields": {"umo": umo, "umo_update_time": now_text}})
+        self.passive_refresh_count += 1
+        logger.debug(f"群{group.group_id}：收到群消息，已被动刷新umo")
+
     # ------------------------------ 其他指令保持不变（仅补充日志/提示） ------------------------------
     @filter.command(
         "pushhelp",
@@ -274,17 +2497,27 @@ class AnnouncementPushPlugin(Star):
 【管理员公告推送插件 - 指令手册】
 📌 所有指令仅管理员可用，支持中英文触发；「推送公告」「定时推送公告」仅支持私聊
 📌 关键提示：
-  - 若推送失败，需在对应群重新发送/pushstart更新会话标识（umo）
-  - @全体成员仅QQ个人号(aiocqhttp)支持，无权限可在WebUI关闭该开关
+  - 已开启推送的群有人发言时会自动刷新会话标识（umo），长期无人发言的群需重新发送/pushstart
+  - @全体成员仅QQ个人号(aiocqhttp)支持，无权限的群会自动改发普通消息（/pushconfig可查看）
 
 📌 公告换行说明：输入\\n（反斜杠+字母n）即可换行，例：/推送公告 好的电话电话\\n干得好的话
+📌 公告占位符：{{group_id}}群号、{{counter}}本次推送序号、{{date}}推送日期、{{time}}推送时间
 
 1. /pushhelp /推送帮助 - 查看插件所有指令（当前指令）
-2. /pushstart /推送开启 - 添加/更新群推送（关键：更新会话标识，解决推送失败）
+2. /pushstart /推送开启 [标签] - 添加/更新群推送（关键：更新会话标识，解决推送失败），可同时设置标签（例：/pushstart vip,新手群）
 3. /pushstop /推送关闭 - 从推送列表移除当前群（仅群聊）
-4. /pushconfig /推送配置 - 查看插件完整配置（全场景）
+4. /pushconfig /推送配置 [分类] [页码] - 查看插件配置概览；分类：groups全部群、valid有效群、expired过期群、tasks定时任务（例：/pushconfig groups 3）
 5. /pushannounce /推送公告 [内容] - 发布即时公告（例：/推送公告 好的电话电话\\n干得好的话）
 6. /schedulepush /定时推送公告 [时间] [内容] - 设置定时公告（例：/定时推送公告 12:00 第一行\\n第二行）
+   重复规则：daily@09:00（每天）、weekly@1,3,5@09:00（每周一三五）、cron@0_9_*_*_1-5（cron各段用_分隔）
+   可选后缀：;until=2026-12-31（截止日期）;tz=Asia/Shanghai（时区）;tags=vip（目标标签），例：daily@09:00;until=2026-12-31
+7. /pushjobs /推送进度 [任务ID] - 查看最近推送任务的投递进度（指定任务ID查看失败明细）
+8. /pushretry /推送重试 [任务ID] - 仅向该任务中失败的群重新推送（已送达的群不重复发送）
+9. /pushstats /推送统计 - 查看发送延迟分位数、吞吐量与失败retcode统计
+10. /pushtag /推送标签 [标签] - 查看/设置当前群的标签（仅群聊，逗号分隔，“清空”移除全部标签）
+11. /pushsegment /分组推送公告 [标签表达式] [内容] - 仅向匹配标签的群发布即时公告
+   标签表达式：vip,新手群（含任一标签）、vip+活跃（同时含两个标签）、-测试（排除），例：/分组推送公告 vip+活跃,-测试 内容
+   定时公告可追加;tags=表达式，例：/定时推送公告 daily@09:00;tags=vip 内容
 
 【当前WebUI配置摘要】
 • 默认公告（↩️表示换行）：{self.default_announcement.replace('\\n', '↩️')[:30]}...
@@ -294,7 +2527,7 @@ class AnnouncementPushPlugin(Star):
         """.strip()
         yield event.plain_result(help_text)
 
-    # （pushstop、pushconfig、pushannounce、schedulepush指令代码保持不变，仅修复pushstart与_send_announcement_to_groups）
+    # ------------------------------ 管理指令（关闭推送、查看配置、公告/分段/定时推送、推送进度与重试、推送统计） ------------------------------
     @filter.command(
         "pushstop",
         alias={"推送关闭"},
@@ -309,18 +2542,13 @@ class AnnouncementPushPlugin(Star):
             yield event.plain_result("获取群ID失败，无法关闭推送")
             return
 
-        original_cnt = len(self.group_config["enabled_groups"])
-        self.group_config["enabled_groups"] = [
-            g for g in self.group_config["enabled_groups"] if g["group_id"] != group_id
-        ]
-
-        if len(self.group_config["enabled_groups"]) == original_cnt:
+        if self.groups.remove(group_id) is None:
             yield event.plain_result(f"群{group_id}不在推送列表中，无需移除")
             return
 
-        self._save_group_config(self.group_config)
+        self._persist_groups({"op": "remove", "group_id": group_id})
         yield event.plain_result(
-            f"群{group_id}已从推送列表移除！当前列表共{len(self.group_config['enabled_groups'])}个群")
+            f"群{group_id}已从推送列表移除！当前列表共{len(self.groups)}个群")
 
     @filter.command(
         "pushconfig",
@@ -328,25 +2556,55 @@ class AnnouncementPushPlugin(Star):
         priority=0
     )
     @filter.permission_type(filter.PermissionType.ADMIN)
-    async def cmd_push_config(self, event: AstrMessageEvent, *args):
-        """推送配置：展示含umo更新时间的群列表（符合文档配置展示规则）"""
-        # 1. 已开启群列表（新增umo更新时间展示）
-        group_text = "暂无已开启推送的群"
-        if self.group_config["enabled_groups"]:
-            group_text = "\n".join([
-                f"- 群ID：{g['group_id']}（添加时间：{g['add_time']}，umo更新时间：{g['umo_update_time']}）"
-                for g in self.group_config["enabled_groups"]
-            ])
-
-        # 2. 定时任务列表（显示换行符提示）
-        task_text = "暂无定时公告任务"
-        if self.scheduled_config["scheduled_tasks"]:
-            task_text = "\n".join([
-                f"- 任务ID：{t['task_id']}（时间：{t['time']}，内容：{t['content'].replace('\\n', '↩️')[:20]}...）"
-                for t in self.scheduled_config["scheduled_tasks"]
-            ])
-
-        # 3. 完整配置文本（补充umo过期说明）
+    async def cmd_push_config(self, event: AstrMessageEvent, section: str = "", page: int = 1):
+        """
+        推送配置：无参数展示配置概览（群/任务只列第一页），带参数分页查看（符合文档配置展示规则）
+        /pushconfig groups|valid|expired|tasks [页码]：只格式化请求的那一页，避免超出平台消息长度限制
+        """
+        section = CONFIG_SECTIONS.get(section.strip().lower(), section.strip().lower())
+        if section in ("groups", "valid", "expired", "tasks"):
+            yield event.plain_result(self._render_config_page(section, page))
+            return
+        if section:
+            yield event.plain_result(
+                f"未知的配置分类“{section}”！用法：/pushconfig [groups|valid|expired|tasks] [页码]\n"
+                f"例：/pushconfig groups 3（全部群第3页）、/pushconfig expired（umo已过期的群）")
+            return
+
+        # 1. 已开启群列表（仅第一页，新增umo更新时间展示）
+        group_text = self._render_config_page("groups", 1, with_title=False)
+
+        # 2. 定时任务列表（仅第一页，显示换行符提示）
+        task_text = self._render_config_page("tasks", 1, with_title=False)
+
+        # 标签分布直接取自倒排索引（不遍历群）
+        tag_text = "、".join(f"{tag}：{cnt}" for tag, cnt in self.groups.tag_counts().items()) or "暂无（/pushtag设置）"
+
+        # 3. @全体成员能力缓存（按平台统计，列出不支持@全体的群）
+        at_all_text = "暂无记录（首次推送后生成）"
+        at_all_summary = self.at_all_cache.summary()
+        if at_all_summary:
+            at_all_text = "\n".join(
+                f"- {platform}：支持{len(v['supported'])}个群，不支持{len(v['rejected'])}个群"
+                + (f"（不支持：{','.join(v['rejected'][:10])}{'等' if len(v['rejected']) > 10 else ''}）" if v["rejected"] else "")
+                for platform, v in at_all_summary.items()
+            )
+
+        # 4. 持久化写盘指标（防抖合并后的实际落盘次数与耗时）
+        store_text = "\n".join([
+            f"- {store.label}：落盘{m['flush_count']}次，合并{m['coalesced_count']}次变更，失败{m['fail_count']}次，"
+            f"平均耗时{m['avg_latency_ms']}ms，最大耗时{m['max_latency_ms']}ms"
+            for store, m in ((st, st.metrics()) for st in (self.group_store, self.scheduled_store, self.queue_store))
+        ])
+
+        # 多实例协调状态（存活实例取自最近一次心跳）
+        coordination_text = "- 多实例协调：关闭（单实例运行）"
+        if self.coordinator is not None:
+            coordination_text = (
+                f"- 多实例协调：SQLite（本实例{self.coordinator.worker_id}，存活实例{len(self.coordinator.live_slots)}个，"
+                f"已同步变更版本{self._coordination_version}）")
+
+        # 5. 完整配置文本（补充umo过期说明）
         config_text = f"""
 【管理员公告推送插件 - 完整配置】
 一、WebUI可视化配置（可在插件管理页修改）
@@ -355,10 +2613,14 @@ class AnnouncementPushPlugin(Star):
 2. @全体成员开关：{"✅ 允许" if self.allow_at_all else "❌ 禁止"}
 3. umo过期时间：{self.umo_expire_hours}小时（超过需重新/pushstart）
 4. 默认定时时间：{self.default_scheduled_time}
+5. @全体能力缓存（有效期{self.at_all_cache_ttl_hours}小时，被拒绝的群自动发送普通消息）：
+{at_all_text}
+6. 被动刷新umo：{f"✅ 开启（同一群间隔{self.passive_refresh_seconds / 60:g}分钟，本次运行已刷新{self.passive_refresh_count}次）" if self.passive_umo_refresh else "❌ 关闭（需手动/pushstart）"}
 
 二、推送列表配置（含umo更新时间）
-已开启推送的群（共{len(self.group_config['enabled_groups'])}个）：
+已开启推送的群（共{len(self.groups)}个，umo已过期{self.groups.count_invalid(self.umo_expire_hours * 3600)}个）：
 {group_text}
+群标签（标签：群数量）：{tag_text}
 上次手动推送时间：{self.group_config.get("last_manual_push_time", "未推送过")}
 
 三、定时公告配置
@@ -366,10 +2628,52 @@ class AnnouncementPushPlugin(Star):
 {task_text}
 上次定时推送时间：{self.scheduled_config.get("last_scheduled_push_time", "未推送过")}
 
+四、持久化状态（写盘防抖间隔：{self.save_debounce_seconds}秒）
+{store_text}
+{coordination_text}
+
 📌 提示1：公告内容输入\\n即可换行；提示2：umo过期/推送失败需重新执行/pushstart
+📌 分页查看：/pushconfig groups [页码]、/pushconfig valid、/pushconfig expired、/pushconfig tasks [页码]
         """.strip()
         yield event.plain_result(config_text)
 
+    def _render_config_page(self, section: str, page: int, with_title: bool = True) -> str:
+        """按分类惰性取出一页条目并格式化（迭代器+islice，其余条目不会被格式化）"""
+        expire_seconds = self.umo_expire_hours * 3600
+        if section == "tasks":
+            tasks = self.scheduled_config["scheduled_tasks"]
+            title, total, items, empty_text = "定时任务", len(tasks), iter(tasks), "暂无定时公告任务"
+            formatter = self._format_task_line
+        else:
+            if section == "valid":
+                title, total, items = "umo有效的群", self.groups.count_valid(expire_seconds), self.groups.iter_valid(expire_seconds)
+            elif section == "expired":
+                title, total, items = "umo已过期/无效的群", self.groups.count_invalid(expire_seconds), self.groups.iter_invalid(expire_seconds)
+            else:
+                title, total, items = "全部群", len(self.groups), iter(self.groups)
+            empty_text = "暂无已开启推送的群" if section == "groups" else f"暂无{title}"
+            formatter = self._format_group_line
+
+        pages = max(1, -(-total // self.config_page_size))
+        page = min(max(1, page), pages)
+        start = (page - 1) * self.config_page_size
+        lines = [formatter(item) for item in itertools.islice(items, start, start + self.config_page_size)]
+        body = "\n".join(lines) if lines else empty_text
+        more = f"（第{page}/{pages}页，/pushconfig {section} {page + 1}查看下一页）" if page < pages else ""
+        if not with_title:
+            return body + ("\n" + more if more else "")
+        return f"【{title}（共{total}个，第{page}/{pages}页）】\n{body}" + ("\n" + more if more else "")
+
+    @staticmethod
+    def _format_group_line(g: GroupRecord) -> str:
+        tag_text = f"，标签：{'、'.join(g.tags)}" if g.tags else ""
+        return f"- 群ID：{g.group_id}（添加时间：{g.add_time}，umo更新时间：{g.umo_update_time}{tag_text}）"
+
+    @staticmethod
+    def _format_task_line(t: dict) -> str:
+        return (f"- 任务ID：{t['task_id']}（规则：{describe_schedule(t)}，下次执行：{t.get('next_run', '未调度')}，"
+                f"内容：{t['content'].replace('\\n', '↩️')[:20]}...）")
+
     @filter.command(
         "pushannounce",
         alias={"推送公告"},
@@ -387,13 +2691,42 @@ class AnnouncementPushPlugin(Star):
 
         # 执行推送（调用修复后的_send_announcement_to_groups）
         push_result = await self._send_announcement_to_groups(content_stripped)
-        self.group_config["last_manual_push_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self._save_group_config(self.group_config)
+        self.group_config["last_manual_push_time"] = datetime.now().strftime(TIME_FORMAT)
+        self._persist_groups({"op": "meta", "data": {"last_manual_push_time": self.group_config["last_manual_push_time"]}})
 
         yield event.plain_result(
             f"即时公告发布完成！\n\n公告内容（推送后实际效果）：\n{content_stripped.replace('\\n', '\n')}\n\n推送结果：\n{push_result}\n📌 提示：推送失败需在对应群重新/pushstart"
         )
 
+    @filter.command(
+        "pushsegment",
+        alias={"分组推送公告"},
+        priority=0
+    )
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.event_message_type(filter.EventMessageType.PRIVATE_MESSAGE)
+    async def cmd_push_segment(self, event: AstrMessageEvent, tag_expr: str, content: str):
+        """分组推送公告：仅向标签表达式匹配的群推送（a,b并集、a+b交集、-c排除）"""
+        content_stripped = content.strip()
+        if not content_stripped:
+            yield event.plain_result(
+                "公告内容不能为空！例：/分组推送公告 vip+活跃,-测试 第一行\\n第二行")
+            return
+        try:
+            target_cnt = len(self.groups.resolve_tags(tag_expr))
+        except ValueError as e:
+            yield event.plain_result(f"标签表达式错误：{str(e)}")
+            return
+
+        push_result = await self._send_announcement_to_groups(content_stripped, tags=tag_expr)
+        self.group_config["last_manual_push_time"] = datetime.now().strftime(TIME_FORMAT)
+        self._persist_groups({"op": "meta", "data": {"last_manual_push_time": self.group_config["last_manual_push_time"]}})
+
+        yield event.plain_result(
+            f"分组公告发布完成！目标标签：{tag_expr}（匹配{target_cnt}个群）\n\n"
+            f"公告内容（推送后实际效果）：\n{content_stripped.replace('\\n', '\n')}\n\n推送结果：\n{push_result}"
+        )
+
     @filter.command(
         "schedulepush",
         alias={"定时推送公告"},
@@ -402,14 +2735,14 @@ class AnnouncementPushPlugin(Star):
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.event_message_type(filter.EventMessageType.PRIVATE_MESSAGE)
     async def cmd_schedule_push(self, event: AstrMessageEvent, push_time: str, content: str):
-        """定时推送公告：支持\n换行（带参指令，纯位置参数🔶1-136）"""
+        """定时推送公告：支持\n换行与每天/每周/cron重复规则（带参指令，纯位置参数🔶1-136）"""
         try:
-            hour, minute = map(int, push_time.split(":"))
-            if not (0 <= hour < 24 and 0 <= minute < 60):
-                raise ValueError("时间需在0-23时、0-59分范围内")
+            schedule_fields = parse_schedule_spec(push_time)
         except Exception as e:
             yield event.plain_result(
-                f"时间格式错误！需为HH:MM（换行示例：/定时推送公告 12:00 第一行\\n第二行）\n错误原因：{str(e)}")
+                f"时间格式错误！需为HH:MM（换行示例：/定时推送公告 12:00 第一行\\n第二行）\n"
+                f"重复规则示例：daily@09:00、weekly@1,3,5@09:00、cron@0_9_*_*_1-5，"
+                f"可追加;until=2026-12-31;tz=Asia/Shanghai\n错误原因：{str(e)}")
             return
 
         content_stripped = content.strip()
@@ -418,16 +2751,121 @@ class AnnouncementPushPlugin(Star):
                 "公告内容不能为空！支持换行，例：/定时推送公告 12:00 好的电话电话\\n干得好的话")
             return
 
-        task_id = f"task_{datetime.now().timestamp():.0f}"
+        now = datetime.now()
+        # 随机后缀：同一秒内创建的任务（包括其他实例创建的）ID不会相同
+        task_id = f"task_{now.timestamp():.0f}_{secrets.token_hex(3)}"
         new_task = {
             "task_id": task_id,
-            "time": push_time,
             "content": content_stripped,
-            "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "create_time": now.strftime(TIME_FORMAT),
+            **schedule_fields  # repeat/time/weekdays/cron/end_date/timezone
         }
+        if compute_next_run(new_task, now, self._cron_cache) is None:
+            yield event.plain_result("该定时规则在截止日期前没有可执行的时间，请检查until选项")
+            return
         self.scheduled_config["scheduled_tasks"].append(new_task)
-        self._save_scheduled_config(self.scheduled_config)
+        self._schedule_task(new_task, now)  # 早于当前最早任务时调度器会被立即唤醒
+        self._persist_scheduled()
+        if self.coordinator is not None:  # 同步给其他实例（到点时按run_key认领，只推送一次）
+            self._publish_change("task", {"op": "upsert", "task": dict(new_task)})
+
+        yield event.plain_result(
+            f"定时公告设置成功！\n\n任务信息：\n- 任务ID：{task_id}\n- 执行规则：{describe_schedule(new_task)}\n"
+            f"- 首次执行：{new_task['next_run']}\n- 公告内容（↩️为换行）：{content_stripped.replace('\\n', '↩️')}\n\n提示1：任务执行时，\\n会自动解析为换行\n提示2：推送失败需在对应群重新/pushstart更新umo"
+        )
 
+    @filter.command(
+        "pushjobs",
+        alias={"推送进度"},
+        priority=0
+    )
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    async def cmd_push_jobs(self, event: AstrMessageEvent, job_id: str = ""):
+        """推送进度：查看最近推送任务的投递进度，指定任务ID时展示失败群明细"""
+        queue = self.delivery_queue
+        if not job_id:
+            if not queue.jobs:
+                yield event.plain_result("暂无推送任务记录")
+                return
+            lines = []
+            for job in list(queue.jobs.values())[-10:][::-1]:
+                counts = queue.progress(job)
+                source = "手动推送" if job["source"] == "manual" else f"定时任务{job['source']}"
+                lines.append(
+                    f"- {job['job_id']}（{source}，{job['push_time']}，{'进行中' if job['status'] == 'running' else '已完成'}）："
+                    + "，".join(f"{label}{counts[state]}" for state, label in queue.STATE_LABELS.items())
+                )
+            yield event.plain_result(
+                "【最近推送任务（最多10条）】\n" + "\n".join(lines) + "\n\n📌 /pushjobs [任务ID]查看失败明细，/pushretry [任务ID]重试失败群")
+            return
+
+        job = queue.jobs.get(job_id)
+        if job is None:
+            yield event.plain_result(f"推送任务{job_id}不存在（仅保留最近{queue.KEEP_FINISHED_JOBS}条已完成任务）")
+            return
+        counts = queue.progress(job)
+        failed = [(gid, s) for gid, s in job["groups"].items() if s["state"] in ("failed", "retrying")]
+        detail = "\n".join(
+            f"- 群{gid}：{queue.STATE_LABELS[s['state']]}（已尝试{s['attempts']}次，{s['last_error'][:60]}）"
+            for gid, s in failed[:30]
+        ) or "无"
+        if len(failed) > 30:
+            detail += f"\n……另有{len(failed) - 30}个群未展示"
+        yield event.plain_result(
+            f"【推送任务 {job_id}】\n"
+            f"推送时间：{job['push_time']}，状态：{'进行中' if job['status'] == 'running' else '已完成'}，"
+            f"目标：{('标签' + job['tags']) if job.get('tags') else '全部群'}\n"
+            f"公告内容（↩️为换行）：{job['content'].replace('\\n', '↩️')[:30]}...\n"
+            f"进度：" + "，".join(f"{label}{counts[state]}" for state, label in queue.STATE_LABELS.items()) +
+            f"\n失败/重试中的群：\n{detail}"
+        )
+
+    @filter.command(
+        "pushretry",
+        alias={"推送重试"},
+        priority=0
+    )
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    async def cmd_push_retry(self, event: AstrMessageEvent, job_id: str):
+        """推送重试：仅向推送任务中失败的群重新发送，已送达的群不会重复推送"""
+        job = self.delivery_queue.jobs.get(job_id.strip())
+        if job is None:
+            yield event.plain_result(f"推送任务{job_id}不存在，可用/pushjobs查看最近的任务ID")
+            return
+        reset = self.delivery_queue.reset_failed(job)
+        if not reset:
+            yield event.plain_result(f"推送任务{job_id}没有失败的群，无需重试")
+            return
+        push_result = await self._deliver_job(job, ("pending",))
+        yield event.plain_result(f"已重试{len(reset)}个失败群！\n\n推送结果：\n{push_result}")
+
+    @filter.command(
+        "pushstats",
+        alias={"推送统计"},
+        priority=0
+    )
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    async def cmd_push_stats(self, event: AstrMessageEvent, *args):
+        """推送统计：展示最近窗口内各平台的发送延迟分位数、吞吐量与失败retcode分布"""
+        stats = self.telemetry.to_dict()
+        platform_text = "暂无发送记录"
+        if stats["platforms"]:
+            platform_text = "\n".join(
+                f"- {platform}：窗口内{s['count']}次（{s['per_minute']}次/分钟），"
+                f"延迟p50≤{s['p50_ms']}ms、p90≤{s['p90_ms']}ms、p99≤{s['p99_ms']}ms、平均{s['avg_ms']}ms\n"
+                f"  累计成功{s['ok_total']}次，失败{s['fail_total']}次"
+                + (f"（按retcode：{'，'.join(f'{code}×{cnt}' for code, cnt in s['errors_by_retcode'].items())}）"
+                   if s["errors_by_retcode"] else "")
+                for platform, s in stats["platforms"].items()
+            )
+        fanout = stats["fanout"]
+        export_text = "未开启" if self.telemetry_export_format not in METRICS_EXPORT_PATHS else \
+            f"{self.telemetry_export_format}，每{self.telemetry_export_interval}秒写入{METRICS_EXPORT_PATHS[self.telemetry_export_format]}"
         yield event.plain_result(
-            f"定时公告设置成功！\n\n任务信息：\n- 任务ID：{task_id}\n- 执行时间：{push_time}\n- 公告内容（↩️为换行）：{content_stripped.replace('\\n', '↩️')}\n\n提示1：任务执行时，\\n会自动解析为换行\n提示2：推送失败需在对应群重新/pushstart更新umo"
+            f"【推送统计（最近{stats['window_minutes']}分钟，运行{stats['uptime_seconds'] // 60}分钟）】\n"
+            f"一、单次发送（平台接口耗时，不含限流等待）\n{platform_text}\n\n"
+            f"二、整次扇出（一次推送所有群的总耗时）\n"
+            f"- 窗口内{fanout['count']}次，p50≤{fanout['p50_ms']}ms、p99≤{fanout['p99_ms']}ms、平均{fanout['avg_ms']}ms\n"
+            f"- 累计{fanout['total']}次扇出，共发送{fanout['groups_total']}个群\n\n"
+            f"三、指标导出：{export_text}"
         )